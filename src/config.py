@@ -17,6 +17,7 @@ class Config:
     recursion_limit: int = 100  # LangGraph recursion limit
     # Input writer generation mode:
     # - "sequential_dependency": generate files sequentially; use already-generated files as context to enforce consistency.
+    # - "tiered_dependency": generate each tier (system / constant / 0 / others) in parallel; later tiers see earlier ones as context.
     # - "parallel_no_context": generate files in parallel without cross-file context (faster, may need more reviewer iterations).
     input_writer_generation_mode: str = "sequential_dependency"
     # Optional: reuse previously generated files by copying from this directory.
@@ -38,6 +39,17 @@ class Config:
     # - Anthropic: claude-3-5-sonnet-latest
     model_version: str = "gpt-5.3-codex"
     temperature: float = 1
+    # Optional content-addressed cache of LLM responses (e.g. "~/.cache/foam_agent/llm").
+    # Empty disables it; when set, byte-identical (model, system, prompt, schema) calls are
+    # answered from disk, which makes reruns/resumes nearly free but also deterministic.
+    llm_cache_dir: str = ""
+    # Number of LLM visualization scripts drafted concurrently for the first fallback attempt
+    # (the first one that renders wins). 1 keeps a single draft; >1 trades tokens for latency.
+    viz_parallelism: int = 1
+    # Optional directory of visualization scripts that worked before, keyed by (solver, field)
+    # (e.g. "~/.cache/foam_agent/viz_templates"). Empty disables it; when set, a stored script
+    # is tried before asking the LLM, and every successful LLM script is stored.
+    viz_template_dir: str = ""
 
     # Embedding Configuration
     embedding_provider: str = "huggingface"  # [openai, huggingface, ollama]
@@ -104,3 +116,9 @@ class Config:
             print(f"<config>embedding_model={self.embedding_model} (env:{emb_model_key})</config>")
         else:
             print(f"<config>embedding_model={self.embedding_model} (default)</config>")
+
+        cache_dir_key = "FOAMAGENT_LLM_CACHE_DIR"
+        cache_dir_env = _env_nonempty(cache_dir_key)
+        if cache_dir_env is not None:
+            self.llm_cache_dir = cache_dir_env
+            print(f"<config>llm_cache_dir={self.llm_cache_dir} (env:{cache_dir_key})</config>")
@@ -4,9 +4,10 @@ from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 import argparse
 from pathlib import Path
-from utils import LLMService, GraphState
+from utils import GraphState
 
 from config import Config
+from services import configure_llm_service
 from nodes.planner_node import planner_node
 from nodes.meshing_node import meshing_node
 from nodes.input_writer_node import input_writer_node
@@ -64,7 +65,7 @@ def initialize_state(user_requirement: str, config: Config, custom_mesh_path: Op
         error_command=None,
         error_content=None,
         loop_count=0,
-        llm_service=LLMService(config),
+        llm_service=configure_llm_service(config),
         case_stats=case_stats,
         tutorial_reference=None,
         case_path_reference=None,
@@ -84,7 +84,6 @@ def hpc_runner_node(state):
                 log_review(str(error_logs), "error_logs")
                 print("</hpc_runner>")
                 return {
-                    **state,
                     "error_logs": error_logs,
                     "job_id": None,
                     "cluster_info": cluster_info,
@@ -99,7 +98,6 @@ def hpc_runner_node(state):
         log_review(str(error_logs), "error_logs")
         print("</hpc_runner>")
         return {
-            **state,
             "error_logs": error_logs,
             "job_id": job_id,
             "cluster_info": cluster_info,
@@ -112,7 +110,6 @@ def hpc_runner_node(state):
         log_review(str(error_logs), "error_logs")
         print("</hpc_runner>")
         return {
-            **state,
             "error_logs": error_logs,
             "job_id": job_id,
             "cluster_info": cluster_info,
@@ -133,7 +130,6 @@ def hpc_runner_node(state):
 
     # Return updated state
     return {
-        **state,
         "error_logs": error_logs,
         "job_id": job_id,
         "cluster_info": cluster_info,
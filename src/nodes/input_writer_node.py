@@ -3,8 +3,6 @@ import os
 from utils import save_file, parse_context, retrieve_faiss, FoamPydantic, FoamfilePydantic
 from services.input_writer import initial_write, build_allrun, rewrite_files
 import re
-from typing import List
-from pydantic import BaseModel, Field
 
 # System prompts for different modes
 INITIAL_WRITE_SYSTEM_PROMPT = (
@@ -31,9 +29,6 @@ def retrieve_commands(command_path) -> str:
     
     return f"[{', '.join([command.strip() for command in commands])}]"
     
-class CommandsPydantic(BaseModel):
-    commands: List[str] = Field(description="List of commands")
-
 def input_writer_node(state):
     """
     InputWriter node: Generate the complete OpenFOAM foamfile.
@@ -32,7 +32,6 @@ def local_runner_node(state):
 
     # Return updated state
     return {
-        **state,
         "error_logs": error_logs
     }
         
\ No newline at end of file
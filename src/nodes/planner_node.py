@@ -3,28 +3,13 @@ import os
 import re
 from typing import Dict, Any, List, Tuple
 from pathlib import Path
-from pydantic import BaseModel, Field
 import shutil
 from utils import save_file, retrieve_faiss, parse_directory_structure, LLMService
 from services.plan import generate_simulation_plan
 from services import global_llm_service
-from router_func import llm_requires_custom_mesh, llm_requires_hpc, llm_requires_visualization
+from router_func import classify_requirement
 from logger import setup_logging
 
-class CaseSummaryPydantic(BaseModel):
-    case_name: str = Field(description="name of the case")
-    case_domain: str = Field(description="domain of the case, case domain must be one of [basic,combustion,compressible,discreteMethods,DNS,electromagnetics,financial,heatTransfer,incompressible,lagrangian,mesh,multiphase,resources,stressAnalysis].")
-    case_category: str = Field(description="category of the case")
-    case_solver: str = Field(description="solver of the case")
-
-
-class SubtaskPydantic(BaseModel):
-    file_name: str = Field(description="Name of the OpenFOAM input file")
-    folder_name: str = Field(description="Name of the folder where the foamfile should be stored")
-
-class OpenFOAMPlanPydantic(BaseModel):
-    subtasks: List[SubtaskPydantic] = Field(description="List of subtasks, each with its corresponding file and folder names")
-
 
 def planner_node(state):
     """
@@ -80,21 +65,21 @@ def planner_node(state):
     # Save reference file
     save_file(case_path_reference, f"{faiss_detailed}\n\n\n{allrun_reference}")
 
+    # One structured call decides mesh type, run target and visualization
+    routing_decision = classify_requirement(state)
+
     # Determine mesh type
-    mesh_type = llm_requires_custom_mesh(state)
-    if mesh_type == 1:
-        mesh_type_value = "custom_mesh"
+    mesh_type_value = routing_decision.mesh_type
+    if mesh_type_value == "custom_mesh":
         print("<mesh_type>custom_mesh - Custom mesh requested.</mesh_type>")
-    elif mesh_type == 2:
-        mesh_type_value = "gmsh_mesh"
+    elif mesh_type_value == "gmsh_mesh":
         print("<mesh_type>gmsh_mesh - GMSH mesh requested.</mesh_type>")
     else:
-        mesh_type_value = "standard_mesh"
         print("<mesh_type>standard_mesh - Standard mesh generation.</mesh_type>")
 
     # Cache routing decisions to avoid repeated LLM calls in routing.
-    requires_hpc = llm_requires_hpc(state)
-    requires_visualization = llm_requires_visualization(state)
+    requires_hpc = routing_decision.run_target == "hpc"
+    requires_visualization = routing_decision.needs_viz
     print(f"<routing_decisions>requires_hpc={requires_hpc}, requires_visualization={requires_visualization}</routing_decisions>")
     print("</planner>")
 
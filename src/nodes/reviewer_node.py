@@ -1,7 +1,5 @@
 # reviewer_node.py
-from pydantic import BaseModel, Field
-from typing import List
-from services.review import review_error_logs, generate_rewrite_plan
+from services.review import review_and_plan, foamfile_hashes, serialize_foamfiles_delta
 from logger import log_review
 
 
@@ -19,31 +17,30 @@ def reviewer_node(state):
     # Log error logs to review.log
     log_review(str(state["error_logs"]), "error_logs")
 
-    # Stateless review via service
+    # Stateless review via service; analysis and rewrite plan share one LLM call
     history_text = state.get("history_text") or []
-    review_content, updated_history = review_error_logs(
+    # After the first review only files edited since then are re-sent in full
+    foamfiles = state.get('foamfiles')
+    prior_hashes = state.get("foamfiles_hashes") or {}
+    foamfiles_text = serialize_foamfiles_delta(foamfiles, prior_hashes, state.get('error_logs', [])) if history_text else None
+    review_content, updated_history, rewrite_plan = review_and_plan(
         tutorial_reference=state.get('tutorial_reference', ''),
-        foamfiles=state.get('foamfiles'),
-        error_logs=state.get('error_logs'),
+        foamfiles=foamfiles,
+        foamfiles_text=foamfiles_text,
+        error_logs=state.get('error_logs', []),
         user_requirement=state.get('user_requirement', ''),
         similar_case_advice=state.get('similar_case_advice'),
         history_text=history_text,
     )
 
     log_review(review_content, "review_analysis")
-
-    rewrite_plan = generate_rewrite_plan(
-        foamfiles=state.get('foamfiles'),
-        error_logs=state.get('error_logs', []),
-        review_analysis=review_content,
-        user_requirement=state.get('user_requirement', ''),
-    )
     log_review(str(rewrite_plan), "rewrite_plan")
 
     print("</reviewer>")
 
     return {
         "history_text": updated_history,
+        "foamfiles_hashes": foamfile_hashes(foamfiles),
         "review_analysis": review_content,
         "rewrite_plan": rewrite_plan,
         "loop_count": state.get("loop_count", 0) + 1,
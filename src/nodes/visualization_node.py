@@ -1,30 +1,79 @@
 # visualization_node.py
+import hashlib
 import os
-from services.visualization import (
-    ensure_foam_file,
-    generate_deterministic_pyvista_script,
-    generate_pyvista_script,
-    run_pyvista_script,
-    fix_pyvista_script,
-)
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Dict, List, Tuple
 
 
 # Routing should decide whether to enter this node (see router_func.llm_requires_visualization).
 
+# (case_dir, field) -> (scan_case results stamp, errors) for deterministic renders that failed.
+# The template is fixed, so rerunning it on unchanged results only re-collects the same errors.
+_DETERMINISTIC_FAILURES: Dict[Tuple[str, str], Tuple[tuple, List[str]]] = {}
+
+# A standalone " p " token (case-sensitive) or "pressure"; then "temperature"; otherwise U.
+_PRESSURE_RE = re.compile(r"(?<![^ ])p(?![^ ])|(?i:pressure)")
+_TEMPERATURE_RE = re.compile(r"temperature", re.IGNORECASE)
+
+
 def _guess_primary_field(user_requirement: str) -> str:
     """Very small heuristic; keep deterministic and conservative."""
     if not user_requirement:
         return "U"
-    text = user_requirement
     # Prefer explicit mentions
-    if " p " in f" {text} " or "pressure" in text.lower():
+    if _PRESSURE_RE.search(user_requirement):
         return "p"
-    if "temperature" in text.lower():
+    if _TEMPERATURE_RE.search(user_requirement):
         return "T"
-    if "u" in text.lower() or "velocity" in text.lower():
-        return "U"
     return "U"
 
+def _tail(error_logs: deque, n: int = 2) -> List[str]:
+    """Last ``n`` entries of ``error_logs`` (what ``list[-n:]`` gave before it became a deque)."""
+    return list(islice(error_logs, max(len(error_logs) - n, 0), None))
+
+
+def _script_ref(case_dir: str, filename: str, script: str) -> dict:
+    """Reference the script run_pyvista_script already saved instead of copying it into state."""
+    return {
+        "script_path": os.path.join(case_dir, filename),
+        "script_sha": hashlib.sha256(script.encode("utf-8")).hexdigest(),
+    }
+
+
+def _success_result(case_dir: str, field_name: str, output_image: str, filename: str, script: str, used: str) -> dict:
+    """State update for a rendered visualization; ``used`` records which script produced it."""
+    print("</visualization>")
+    return {
+        "plot_configs": [
+            {
+                "plot_type": "pyvista",
+                "field_name": field_name,
+                "time_step": "latest",
+                "output_format": "png",
+                "output_path": output_image,
+            }
+        ],
+        "plot_outputs": [output_image],
+        "visualization_summary": {
+            "total_plots_generated": 1,
+            "plot_types": ["pyvista"],
+            "fields_visualized": [field_name],
+            "output_directory": case_dir,
+            "pyvista_success": True,
+            "used": used,
+        },
+        "pyvista_visualization": {
+            "success": True,
+            "output_image": output_image,
+            **_script_ref(case_dir, filename, script),
+            "used": used,
+        },
+    }
+
+
 def visualization_node(state):
     """Visualization node: create a minimal PyVista screenshot for an OpenFOAM case.
 
@@ -33,6 +82,20 @@ def visualization_node(state):
       - Deterministic output path + deterministic artifact detection
       - Prefer a fixed, headless-safe renderer; fall back to LLM self-correct if needed
     """
+    # Imported on first use so building the graph does not load the visualization service
+    from services.visualization import (
+        ensure_foam_file,
+        find_cached_visualization,
+        pyvista_timeout_for_case,
+        scan_case,
+        generate_deterministic_pyvista_script,
+        generate_pyvista_script,
+        run_pyvista_script,
+        fix_pyvista_script,
+        load_script_template,
+        store_script_template,
+    )
+
     user_requirement = state.get("user_requirement", "")
     case_dir = state.get("case_dir")
 
@@ -43,19 +106,22 @@ def visualization_node(state):
     if not case_dir:
         print("</visualization>")
         return {
-            **state,
             "plot_configs": [],
             "plot_outputs": [],
             "visualization_summary": {"error": "Missing case_dir"},
             "pyvista_visualization": {"success": False, "error": "Missing case_dir"},
         }
 
+    # Deterministic artifact path (relative to case_dir)
+    output_png_rel = "visualization.png"
+
     case_dir = os.path.abspath(case_dir)
-    if not os.path.exists(case_dir):
+    # One directory pass answers "does the case exist" and "is the PNG current?"
+    case_scan = scan_case(case_dir, output_png_rel)
+    if case_scan is None:
         print(f"Case directory does not exist: {case_dir}")
         print("</visualization>")
         return {
-            **state,
             "plot_configs": [],
             "plot_outputs": [],
             "visualization_summary": {"error": f"Case directory does not exist: {case_dir}"},
@@ -65,14 +131,15 @@ def visualization_node(state):
     foam_file = ensure_foam_file(case_dir)
 
     max_loop = getattr(state.get("config"), "max_loop", 2)
-    timeout_s = 180
-
-    # Deterministic artifact path (relative to case_dir)
-    output_png_rel = "visualization.png"
+    viz_parallelism = max(1, getattr(state.get("config"), "viz_parallelism", 1))
+    template_dir = getattr(state.get("config"), "viz_template_dir", "")
+    case_solver = state.get("case_solver") or ""
+    timeout_s = pyvista_timeout_for_case(case_dir)
 
     field_name = _guess_primary_field(user_requirement)
 
-    error_logs = []
+    # Only the newest entries are ever fed back to the LLM; cap what a long failure loop keeps
+    error_logs: deque = deque(maxlen=32)
 
     # Attempt 1: deterministic template (preferred)
     deterministic_script = generate_deterministic_pyvista_script(
@@ -80,140 +147,143 @@ def visualization_node(state):
         output_png=output_png_rel,
         field_preference=field_name,
     )
-    success, output_image, errs = run_pyvista_script(
+    # Skip the PyVista subprocess when this exact script already rendered the current results
+    output_image = find_cached_visualization(
         case_dir,
         deterministic_script,
         filename="visualization.py",
         expected_png=output_png_rel,
-        timeout_s=timeout_s,
+        scan=case_scan,
     )
+    if output_image:
+        used = "cached_artifact"
+        success, errs = True, []
+    else:
+        used = "deterministic_template"
+        failure_key = (case_dir, field_name)
+        known_failure = _DETERMINISTIC_FAILURES.get(failure_key)
+        if known_failure and known_failure[0] == case_scan["results_stamp"]:
+            success, output_image, errs = False, "", list(known_failure[1])
+        else:
+            success, output_image, errs = run_pyvista_script(
+                case_dir,
+                deterministic_script,
+                filename="visualization.py",
+                expected_png=output_png_rel,
+                timeout_s=timeout_s,
+                foam_file=foam_file,
+            )
+            if success and output_image:
+                _DETERMINISTIC_FAILURES.pop(failure_key, None)
+            else:
+                _DETERMINISTIC_FAILURES[failure_key] = (case_scan["results_stamp"], list(errs))
     if success and output_image:
-        plot_configs = [
-            {
-                "plot_type": "pyvista",
-                "field_name": field_name,
-                "time_step": "latest",
-                "output_format": "png",
-                "output_path": output_image,
-            }
-        ]
-        print("</visualization>")
-        return {
-            **state,
-            "plot_configs": plot_configs,
-            "plot_outputs": [output_image],
-            "visualization_summary": {
-                "total_plots_generated": 1,
-                "plot_types": ["pyvista"],
-                "fields_visualized": [field_name],
-                "output_directory": case_dir,
-                "pyvista_success": True,
-                "used": "deterministic_template",
-            },
-            "pyvista_visualization": {
-                "success": True,
-                "output_image": output_image,
-                "script": deterministic_script,
-                "used": "deterministic_template",
-            },
-        }
+        return _success_result(case_dir, field_name, output_image, "visualization.py", deterministic_script, used)
 
     error_logs.extend(errs)
 
+    # The deterministic render failed, so the LLM fallback will probably be needed: draft the
+    # first fallback script(s) now, with its errors, while the stored template (if any)
+    # renders. With viz_parallelism > 1 several drafts race and the first that renders wins.
+    llm_pool = ThreadPoolExecutor(max_workers=viz_parallelism)
+    draft_scripts = [
+        llm_pool.submit(generate_pyvista_script, case_dir, foam_file, user_requirement, _tail(error_logs))
+        for _ in range(viz_parallelism)
+    ]
+    llm_pool.shutdown(wait=False)
+
+    # A script that worked on an earlier case with the same solver and field skips the LLM
+    if template_dir:
+        template_script = load_script_template(template_dir, case_solver, field_name, case_dir, foam_file)
+        if template_script:
+            success, output_image, errs = run_pyvista_script(
+                case_dir,
+                template_script,
+                filename="visualization_template.py",
+                expected_png=output_png_rel,
+                timeout_s=timeout_s,
+                foam_file=foam_file,
+            )
+            if success and output_image:
+                for future in draft_scripts:
+                    future.cancel()
+                return _success_result(
+                    case_dir, field_name, output_image, "visualization_template.py", template_script, "script_template"
+                )
+            error_logs.extend(errs)
+
     # Fallback: LLM generate + self-correct loop (kept, but artifact path is deterministic)
     current_loop = 0
     while current_loop < max_loop:
         current_loop += 1
         print(f"LLM visualization attempt {current_loop} of {max_loop}")
 
-        viz_script = generate_pyvista_script(case_dir, foam_file, user_requirement, error_logs[-2:])
-        success, output_image, errs = run_pyvista_script(
-            case_dir,
-            viz_script,
-            filename="visualization_llm.py",
-            expected_png=output_png_rel,
-            timeout_s=timeout_s,
-        )
+        success, output_image, errs = False, "", []
+        viz_script = None
+
+        # Try the drafts in the order they arrive and stop at the first that renders;
+        # identical drafts (e.g. served from the LLM cache) are only run once.
+        tried = set()
+        for future in as_completed(draft_scripts):
+            try:
+                candidate = future.result()
+            except Exception:
+                continue
+            if not candidate or candidate in tried:
+                continue
+            tried.add(candidate)
+            if viz_script is not None:
+                error_logs.extend(errs)
+            viz_script = candidate
+            success, output_image, errs = run_pyvista_script(
+                case_dir,
+                viz_script,
+                filename="visualization_llm.py",
+                expected_png=output_png_rel,
+                timeout_s=timeout_s,
+                foam_file=foam_file,
+            )
+            if success and output_image:
+                break
+        draft_scripts = []
+        if viz_script is None:
+            viz_script = generate_pyvista_script(case_dir, foam_file, user_requirement, _tail(error_logs))
+            success, output_image, errs = run_pyvista_script(
+                case_dir,
+                viz_script,
+                filename="visualization_llm.py",
+                expected_png=output_png_rel,
+                timeout_s=timeout_s,
+                foam_file=foam_file,
+            )
 
         if success and output_image:
-            plot_configs = [
-                {
-                    "plot_type": "pyvista",
-                    "field_name": field_name,
-                    "time_step": "latest",
-                    "output_format": "png",
-                    "output_path": output_image,
-                }
-            ]
-            print("</visualization>")
-            return {
-                **state,
-                "plot_configs": plot_configs,
-                "plot_outputs": [output_image],
-                "visualization_summary": {
-                    "total_plots_generated": 1,
-                    "plot_types": ["pyvista"],
-                    "fields_visualized": [field_name],
-                    "output_directory": case_dir,
-                    "pyvista_success": True,
-                    "used": "llm_script",
-                },
-                "pyvista_visualization": {
-                    "success": True,
-                    "output_image": output_image,
-                    "script": viz_script,
-                    "used": "llm_script",
-                },
-            }
+            if template_dir:
+                store_script_template(template_dir, case_solver, field_name, case_dir, foam_file, viz_script)
+            return _success_result(case_dir, field_name, output_image, "visualization_llm.py", viz_script, "llm_script")
 
         error_logs.extend(errs)
 
         if current_loop < max_loop:
-            fixed_script = fix_pyvista_script(foam_file, viz_script, error_logs[-2:])
+            fixed_script = fix_pyvista_script(foam_file, viz_script, _tail(error_logs), case_dir)
             success, output_image, errs = run_pyvista_script(
                 case_dir,
                 fixed_script,
                 filename="visualization_fixed.py",
                 expected_png=output_png_rel,
                 timeout_s=timeout_s,
+                foam_file=foam_file,
             )
             if success and output_image:
-                plot_configs = [
-                    {
-                        "plot_type": "pyvista",
-                        "field_name": field_name,
-                        "time_step": "latest",
-                        "output_format": "png",
-                        "output_path": output_image,
-                    }
-                ]
-                print("</visualization>")
-                return {
-                    **state,
-                    "plot_configs": plot_configs,
-                    "plot_outputs": [output_image],
-                    "visualization_summary": {
-                        "total_plots_generated": 1,
-                        "plot_types": ["pyvista"],
-                        "fields_visualized": [field_name],
-                        "output_directory": case_dir,
-                        "pyvista_success": True,
-                        "used": "llm_fixed_script",
-                    },
-                    "pyvista_visualization": {
-                        "success": True,
-                        "output_image": output_image,
-                        "script": fixed_script,
-                        "used": "llm_fixed_script",
-                    },
-                }
+                if template_dir:
+                    store_script_template(template_dir, case_solver, field_name, case_dir, foam_file, fixed_script)
+                return _success_result(case_dir, field_name, output_image, "visualization_fixed.py", fixed_script, "llm_fixed_script")
             error_logs.extend(errs)
 
     error_message = f"Visualization failed after {max_loop} LLM attempts"
     print(f"<visualization_error>{error_message}</visualization_error>")
     print("</visualization>")
     return {
-        **state,
         "plot_configs": [],
         "plot_outputs": [],
         "visualization_summary": {
@@ -223,7 +293,7 @@ def visualization_node(state):
             "output_directory": case_dir,
             "pyvista_success": False,
             "error": error_message,
-            "error_logs": error_logs,
+            "error_logs": list(error_logs),
         },
-        "pyvista_visualization": {"success": False, "error": error_message, "error_logs": error_logs},
+        "pyvista_visualization": {"success": False, "error": error_message, "error_logs": list(error_logs)},
     }
@@ -1,10 +1,123 @@
-from typing import TypedDict, List, Optional
+import hashlib
+import re
+from typing import Dict, TypedDict, List, Literal, Optional
+from pydantic import BaseModel, Field
 from config import Config
 from utils import LLMService, GraphState
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 
 
+class RoutingDecision(BaseModel):
+    mesh_type: Literal["standard_mesh", "custom_mesh", "gmsh_mesh"] = Field(
+        description="custom_mesh to import a user-provided mesh file, gmsh_mesh to build the mesh with gmsh, otherwise standard_mesh"
+    )
+    run_target: Literal["hpc", "local"] = Field(description="hpc to run on a cluster/HPC system, otherwise local")
+    needs_viz: bool = Field(description="True only if the user explicitly asks for visualization of the results")
+
+
+ROUTING_SYSTEM_PROMPT = (
+    "You are an expert in OpenFOAM workflow analysis. "
+    "Analyze the user requirement and make three independent routing decisions.\n"
+    "1. mesh_type: "
+    "Look for keywords like: custom mesh, mesh file, .msh, .stl, .obj, gmsh, snappyHexMesh, "
+    "or any mention of importing/using external mesh files. "
+    "If the user explicitly mentions or implies they want to use a custom mesh file, choose 'custom_mesh'. "
+    "If they want to use standard OpenFOAM mesh generation (blockMesh, snappyHexMesh with STL, etc.), choose 'standard_mesh'. "
+    "If they want to create the mesh using gmsh, choose 'gmsh_mesh'. "
+    "Be conservative - if unsure, choose 'standard_mesh' unless clearly specified otherwise.\n"
+    "2. run_target: "
+    "Look for keywords like: HPC, cluster, supercomputer, SLURM, PBS, job queue, "
+    "parallel computing, distributed computing, or any mention of running on remote systems. "
+    "If the user explicitly mentions or implies they want to run on HPC/cluster, choose 'hpc'. "
+    "If they want to run locally or don't specify, choose 'local'. "
+    "Be conservative - if unsure, choose 'local'.\n"
+    "3. needs_viz: "
+    "Signals include requests to: visualize/plot/render results, create images/figures, contours, vectors, streamlines, "
+    "Paraview/PyVista, post-processing, screenshots, or animations. "
+    "Set it to true ONLY if the user explicitly requests visualization. "
+    "If they do not mention visualization, or you are unsure, set it to false."
+)
+
+
+# Keyword fast path for classify_requirement. Each axis is decided from keywords only when
+# they are unambiguous: a decisive trigger, or no related wording at all (the conservative
+# default). Anything in between (e.g. "parallel", an .stl for snappyHexMesh, a negated
+# "no plots", "a cluster of cylinders", "match the reference figure") leaves the whole
+# decision to the LLM.
+_GMSH_RE = re.compile(r"\bgmsh\b", re.IGNORECASE)
+_CUSTOM_MESH_RE = re.compile(r"\.msh\b|\.obj\b|\bcustom mesh\b|\bmesh file\b", re.IGNORECASE)
+_MESH_MENTION_RE = re.compile(r"\bgmsh\b|\.msh\b|\.stl\b|\.obj\b|snappyhexmesh|custom mesh|mesh file|\bimport", re.IGNORECASE)
+_HPC_RE = re.compile(r"\b(?:hpc|slurm|pbs|sbatch|supercomputer)\b", re.IGNORECASE)
+_HPC_MENTION_RE = re.compile(r"\b(?:parallel|distributed|remote|mpi|nodes|cores|job|cluster)\b", re.IGNORECASE)
+_VIZ_RE = re.compile(
+    r"visuali[sz]|\bplot|\brender|screenshot|pyvista|paraview|streamline|animation|post-?process",
+    re.IGNORECASE,
+)
+# Also used for geometry or reference material ("a figure of the domain")
+_VIZ_MENTION_RE = re.compile(r"\bimages?\b|\bfigures?\b|contour", re.IGNORECASE)
+# "no-slip" and similar compounds are not negations
+_NEGATION_RE = re.compile(r"\b(?:no|not|without|skip|don't|do not|never)\b(?!-)", re.IGNORECASE)
+
+
+def _keyword_routing(user_requirement: str) -> Optional[RoutingDecision]:
+    """Decide routing from keywords when that is unambiguous; None means ask the LLM."""
+    mesh_mentioned = _MESH_MENTION_RE.search(user_requirement)
+    if not mesh_mentioned:
+        mesh_type = "standard_mesh"
+    elif _GMSH_RE.search(user_requirement) and not _CUSTOM_MESH_RE.search(user_requirement):
+        mesh_type = "gmsh_mesh"
+    elif _CUSTOM_MESH_RE.search(user_requirement) and not _GMSH_RE.search(user_requirement) and "snappyhexmesh" not in user_requirement.lower():
+        mesh_type = "custom_mesh"
+    else:
+        return None
+
+    if _HPC_RE.search(user_requirement):
+        run_target = "hpc"
+    elif not _HPC_MENTION_RE.search(user_requirement):
+        run_target = "local"
+    else:
+        return None
+
+    if _VIZ_RE.search(user_requirement):
+        if _NEGATION_RE.search(user_requirement):
+            return None
+        needs_viz = True
+    elif not _VIZ_MENTION_RE.search(user_requirement):
+        needs_viz = False
+    else:
+        return None
+
+    return RoutingDecision(mesh_type=mesh_type, run_target=run_target, needs_viz=needs_viz)
+
+
+# sha1(user_requirement) -> decision; the requirement is fixed for a whole run, so routers
+# re-entered on later loop iterations never repeat the LLM call
+_ROUTING_CACHE: Dict[str, RoutingDecision] = {}
+
+
+def classify_requirement(state: GraphState) -> RoutingDecision:
+    """
+    Use a single structured LLM call to make all routing decisions for the user requirement.
+    Unambiguous keyword matches (see ``_keyword_routing``) skip the LLM call.
+    
+    Args:
+        state: Current graph state containing user requirement and LLM service
+        
+    Returns:
+        RoutingDecision: mesh type, run target and whether visualization is requested
+    """
+    key = hashlib.sha1(state["user_requirement"].encode("utf-8")).hexdigest()
+    decision = _ROUTING_CACHE.get(key)
+    if decision is None:
+        decision = _keyword_routing(state["user_requirement"])
+    if decision is None:
+        user_prompt = f"User requirement: {state['user_requirement']}"
+        decision = state["llm_service"].invoke(user_prompt, ROUTING_SYSTEM_PROMPT, pydantic_obj=RoutingDecision)
+    _ROUTING_CACHE[key] = decision
+    return decision
+
+
 def llm_requires_custom_mesh(state: GraphState) -> int:
     """
     Use LLM to determine if user requires custom mesh based on their requirement.
@@ -15,31 +128,10 @@ def llm_requires_custom_mesh(state: GraphState) -> int:
     Returns:
         int: 1 if custom mesh is required, 2 if gmsh mesh is required, 0 otherwise
     """
-    user_requirement = state["user_requirement"]
-    
-    system_prompt = (
-        "You are an expert in OpenFOAM workflow analysis. "
-        "Analyze the user requirement to determine if they want to use a custom mesh file. "
-        "Look for keywords like: custom mesh, mesh file, .msh, .stl, .obj, gmsh, snappyHexMesh, "
-        "or any mention of importing/using external mesh files. "
-        "If the user explicitly mentions or implies they want to use a custom mesh file, return 'custom_mesh'. "
-        "If they want to use standard OpenFOAM mesh generation (blockMesh, snappyHexMesh with STL, etc.), return 'standard_mesh'. "
-        "Look for keywords like gmsh and determine if they want to create mesh using gmsh. If they want to create mesh using gmsh, return 'gmsh_mesh'. "
-        "Be conservative - if unsure, assume 'standard_mesh' unless clearly specified otherwise."
-        "Only return 'custom_mesh' or 'standard_mesh' or 'gmsh_mesh'. Don't return anything else."
-    )
-    
-    user_prompt = (
-        f"User requirement: {user_requirement}\n\n"
-        "Determine if the user wants to use a custom mesh file. "
-        "Return exactly 'custom_mesh' if they want to use a custom mesh file, "
-        "'standard_mesh' if they want standard OpenFOAM mesh generation or 'gmsh_mesh' if they want to create mesh using gmsh."
-    )
-    
-    response = state["llm_service"].invoke(user_prompt, system_prompt)
-    if "custom_mesh" in response.lower():
+    mesh_type = classify_requirement(state).mesh_type
+    if mesh_type == "custom_mesh":
         return 1
-    elif "gmsh_mesh" in response.lower():
+    elif mesh_type == "gmsh_mesh":
         return 2
     else:
         return 0
@@ -55,26 +147,7 @@ def llm_requires_hpc(state: GraphState) -> bool:
     Returns:
         bool: True if HPC execution is required, False otherwise
     """
-    user_requirement = state["user_requirement"]
-    
-    system_prompt = (
-        "You are an expert in OpenFOAM workflow analysis. "
-        "Analyze the user requirement to determine if they want to run the simulation on HPC (High Performance Computing) or locally. "
-        "Look for keywords like: HPC, cluster, supercomputer, SLURM, PBS, job queue, "
-        "parallel computing, distributed computing, or any mention of running on remote systems. "
-        "If the user explicitly mentions or implies they want to run on HPC/cluster, return 'hpc_run'. "
-        "If they want to run locally or don't specify, return 'local_run'. "
-        "Be conservative - if unsure, assume local run unless clearly specified otherwise."
-        "Only return 'hpc_run' or 'local_run'. Don't return anything else."
-    )
-    
-    user_prompt = (
-        f"User requirement: {user_requirement}\n\n"
-        "return 'hpc_run' or 'local_run'"
-    )
-    
-    response = state["llm_service"].invoke(user_prompt, system_prompt)
-    return "hpc_run" in response.lower()
+    return classify_requirement(state).run_target == "hpc"
 
 
 def llm_requires_visualization(state: GraphState) -> bool:
@@ -83,25 +156,7 @@ def llm_requires_visualization(state: GraphState) -> bool:
     Policy: ONLY visualize when the user explicitly asks for it.
     If uncertain, default to NO visualization (avoid expensive/flaky post-processing).
     """
-    user_requirement = state["user_requirement"]
-
-    system_prompt = (
-        "You are an expert in OpenFOAM workflow analysis. "
-        "Analyze the user requirement to determine if they explicitly want visualization/post-processing of results. "
-        "Signals include requests to: visualize/plot/render results, create images/figures, contours, vectors, streamlines, "
-        "Paraview/PyVista, post-processing, screenshots, or animations. "
-        "Return 'yes_visualization' ONLY if the user explicitly requests visualization. "
-        "If they do not mention visualization, or you are unsure, return 'no_visualization'. "
-        "Only return 'yes_visualization' or 'no_visualization'."
-    )
-
-    user_prompt = (
-        f"User requirement: {user_requirement}\n\n"
-        "Return exactly: 'yes_visualization' or 'no_visualization'."
-    )
-
-    response = state["llm_service"].invoke(user_prompt, system_prompt)
-    return "yes_visualization" in response.lower()
+    return classify_requirement(state).needs_viz
 
 
 def route_after_planner(state: GraphState):
@@ -1,6 +1,44 @@
 # Namespace package for service-layer wrappers
+import threading
+from typing import Any, Optional
+
 from utils import LLMService
 from config import Config
 
-# Global LLM service instance for services
-global_llm_service = LLMService(Config())
\ No newline at end of file
+_llm_service: Optional[LLMService] = None
+_llm_service_lock = threading.Lock()
+
+
+def get_llm_service() -> LLMService:
+    """Current shared LLM service; built from the default Config() if none was configured."""
+    global _llm_service
+    if _llm_service is None:
+        with _llm_service_lock:
+            if _llm_service is None:
+                _llm_service = LLMService(Config())
+    return _llm_service
+
+
+def configure_llm_service(config: Config) -> LLMService:
+    """Build a fresh LLM service from ``config`` and make services use it.
+
+    Called once per workflow run, so the run's model/provider/cache settings apply and
+    its statistics start from zero.
+    """
+    global _llm_service
+    service = LLMService(config)
+    with _llm_service_lock:
+        _llm_service = service
+    return service
+
+
+class _SharedLLMService:
+    """Forwards to the current shared service, so ``from services import global_llm_service``
+    bound at import time follows later ``configure_llm_service`` calls."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_llm_service(), name)
+
+
+# Importing the services package does not build a client; the service is created on first use
+global_llm_service = _SharedLLMService()
@@ -1,20 +1,51 @@
+import functools
 import os
 import re
 from typing import Dict, List, Any, Optional, Callable
 import shutil
-from utils import save_file, parse_context, retrieve_faiss, FoamPydantic, FoamfilePydantic, scan_case_directory, read_case_foamfiles, read_file
+from pydantic import BaseModel, Field
+from utils import save_file, parse_context, retrieve_faiss_batch, FoamPydantic, FoamfilePydantic, scan_case_directory, read_case_foamfiles, read_file
 from . import global_llm_service
 
+_FENCE_RE = re.compile(r'```(.*?)```', re.DOTALL)
+
+
+# Structured response for build_allrun's command selection; defined once so the
+# structured-output wrapper built for it is reused across calls
+class CommandsPydantic(BaseModel):
+    commands: List[str] = Field(description="List of commands")
+
+
+# Generation order of the case folders; anything else comes last
+_FOLDER_PRIORITY = {"system": 0, "constant": 1, "0": 2}
+
 
 def compute_priority(subtask):
-    if subtask["folder_name"] == "system":
-        return 0
-    elif subtask["folder_name"] == "constant":
-        return 1
-    elif subtask["folder_name"] == "0":
-        return 2
-    else:
-        return 3
+    return _FOLDER_PRIORITY.get(subtask["folder_name"], 3)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_commands(database_path: str) -> str:
+    """The database's command list formatted for the prompt; read once per database."""
+    command_path = f"{database_path}/raw/openfoam_commands.txt"
+    try:
+        with open(command_path, 'r') as file:
+            commands = file.readlines()
+    except (FileNotFoundError, IOError) as e:
+        # Not cached by lru_cache, so a file created later is picked up
+        raise ValueError(f"Could not read commands file {command_path}: {e}")
+    return f"[{', '.join([c.strip() for c in commands])}]"
+
+
+def _matches_on_disk(path: str, content: str) -> bool:
+    """Return True if ``path`` already holds exactly ``content``."""
+    try:
+        # Size first, so a changed file is almost never read back
+        if os.path.getsize(path) != len(content.encode()):
+            return False
+        return read_file(path) == content
+    except (OSError, UnicodeDecodeError):
+        return False
 
 
 def initial_write(
@@ -91,69 +122,67 @@ def initial_write(
             except Exception:
                 pass
 
-    if generation_mode not in {"sequential_dependency", "parallel_no_context"}:
+    if generation_mode not in {"sequential_dependency", "tiered_dependency", "parallel_no_context"}:
         raise ValueError(
             f"Unsupported generation_mode: {generation_mode}. "
-            "Expected one of: sequential_dependency, parallel_no_context"
+            "Expected one of: sequential_dependency, tiered_dependency, parallel_no_context"
         )
 
     subtasks = sorted(subtasks, key=compute_priority)
     written_files = []
     dir_structure = {}
 
-    # System prompt for file generation
-    INITIAL_WRITE_SYSTEM_PROMPT = (
+    # System prompt for file generation. It is identical for every file of the case (the
+    # target file is named at the end of the user prompt), so providers can cache it.
+    code_system_prompt = (
         "You are an expert in OpenFOAM simulation and numerical modeling."
-        f"Your task is to generate a complete and functional file named: <file_name>{{file_name}}</file_name> within the <folder_name>{{folder_name}}</folder_name> directory. "
+        "Your task is to generate a complete and functional file; its <file_name> and <folder_name> are given at the end of the request. "
         "Ensure all required values are present and match with the files content already generated."
         "Before finalizing the output, ensure:\n"
         "- All necessary fields exist (e.g., if `nu` is defined in `constant/transportProperties`, it must be used correctly in `0/U`).\n"
         "- Cross-check field names between different files to avoid mismatches.\n"
         "- Ensure units and dimensions are correct** for all physical variables.\n"
-        f"- Ensure case solver settings are consistent with the user's requirements. Available solvers are: {{case_solver}}.\n"
+        f"- Ensure case solver settings are consistent with the user's requirements. Available solvers are: {case_solver}.\n"
         "Provide only the code—no explanations, comments, or additional text."
     )
 
-    def _build_prompts(file_name: str, folder_name: str, written_files_ctx: List[FoamfilePydantic]) -> tuple[str, str]:
-        code_system_prompt = INITIAL_WRITE_SYSTEM_PROMPT.format(
-            file_name=file_name,
-            folder_name=folder_name,
-            case_solver=case_solver,
+    advice_text = ""
+    if isinstance(similar_case_advice, dict):
+        advice_text = (
+            f"Similar case match level: {similar_case_advice.get('match_level')}\n"
+            f"Use scope: {similar_case_advice.get('use_scope')}\n"
+            f"Advice: {similar_case_advice.get('advice')}\n"
         )
+    elif similar_case_advice:
+        advice_text = str(similar_case_advice)
 
-        advice_text = ""
-        if isinstance(similar_case_advice, dict):
-            advice_text = (
-                f"Similar case match level: {similar_case_advice.get('match_level')}\n"
-                f"Use scope: {similar_case_advice.get('use_scope')}\n"
-                f"Advice: {similar_case_advice.get('advice')}\n"
-            )
-        elif similar_case_advice:
-            advice_text = str(similar_case_advice)
-
-        similar_ref_block = (
-            f"Refer to the following similar case file content if helpful:\n<similar_case_reference>{tutorial_reference}</similar_case_reference>\n"
-            if tutorial_reference else "No suitable similar case was found for this domain.\n"
-        )
+    similar_ref_block = (
+        f"Refer to the following similar case file content if helpful:\n<similar_case_reference>{tutorial_reference}</similar_case_reference>\n"
+        if tutorial_reference else "No suitable similar case was found for this domain.\n"
+    )
 
-        code_user_prompt = (
-            f"User requirement: {user_requirement}\n"
-            f"{similar_ref_block}"
-            f"{advice_text}"
-            "If the similar case is a weak match, do not copy it blindly. Use it only where it is consistent with the user requirement. "
-            "Just modify the necessary parts to make the file complete and functional."
-            "Please ensure that the generated file is complete, functional, and logically sound."
-            "Additionally, apply your domain expertise to verify that all numerical values are consistent with the user's requirements, maintaining accuracy and coherence."
-            "When generating controlDict, do not include anything to preform post processing. Just include the necessary settings to run the simulation."
-        )
+    # Shared by every file of the case; the growing file context and the target file are
+    # appended after it so the long reference prefix stays identical between calls
+    shared_user_prompt = (
+        f"User requirement: {user_requirement}\n"
+        f"{similar_ref_block}"
+        f"{advice_text}"
+        "If the similar case is a weak match, do not copy it blindly. Use it only where it is consistent with the user requirement. "
+        "Just modify the necessary parts to make the file complete and functional."
+        "Please ensure that the generated file is complete, functional, and logically sound."
+        "Additionally, apply your domain expertise to verify that all numerical values are consistent with the user's requirements, maintaining accuracy and coherence."
+        "When generating controlDict, do not include anything to preform post processing. Just include the necessary settings to run the simulation."
+    )
 
-        if generation_mode == "sequential_dependency" and written_files_ctx:
+    def _build_user_prompt(file_name: str, folder_name: str, written_files_ctx: List[FoamfilePydantic]) -> str:
+        code_user_prompt = shared_user_prompt
+        if generation_mode != "parallel_no_context" and written_files_ctx:
             code_user_prompt += (
                 f"The following are files content already generated: {str(written_files_ctx)}\n\n\n"
                 "You should ensure that the new file is consistent with the previous files. Such as boundary conditions, mesh settings, etc."
             )
-
-        return code_user_prompt, code_system_prompt
+        code_user_prompt += f"\nGenerate the file <file_name>{file_name}</file_name> within the <folder_name>{folder_name}</folder_name> directory."
+        return code_user_prompt
 
     def _generate_one(subtask: Dict[str, str], written_files_ctx: List[FoamfilePydantic]) -> FoamfilePydantic:
         file_name = subtask["file_name"]
@@ -175,16 +204,12 @@ def initial_write(
                 reused_content = read_file(reuse_src)
                 return FoamfilePydantic(file_name=file_name, folder_name=folder_name, content=reused_content)
 
-        code_user_prompt, code_system_prompt = _build_prompts(file_name, folder_name, written_files_ctx)
+        code_user_prompt = _build_user_prompt(file_name, folder_name, written_files_ctx)
 
-        if generation_mode == "parallel_no_context":
-            # Avoid shared global LLM instance in parallel mode.
-            from utils import LLMService
-            from config import Config
-            llm = LLMService(Config())
-            generation_response = llm.invoke(code_user_prompt, code_system_prompt)
-        else:
-            generation_response = global_llm_service.invoke(code_user_prompt, code_system_prompt)
+        # The shared service is thread-safe, so parallel workers reuse its client and pool
+        generation_response = global_llm_service.invoke(
+            code_user_prompt, code_system_prompt, cache_prefix=shared_user_prompt
+        )
 
         code_context = parse_context(generation_response)
         save_file(file_path, code_context)
@@ -201,6 +226,21 @@ def initial_write(
     total_steps = len(subtasks) + (2 if database_path else 0)
     _report_progress(0, total_steps, f"Starting file generation for {len(subtasks)} files")
 
+    # The Allrun script only depends on the planned dir_structure, not on file contents,
+    # so its two LLM calls run while the foam files are generated. Its progress is
+    # reported afterwards to keep the progress counter monotonic.
+    allrun_future = None
+    if database_path:
+        from concurrent.futures import ThreadPoolExecutor
+
+        allrun_pool = ThreadPoolExecutor(max_workers=1)
+        allrun_future = allrun_pool.submit(
+            build_allrun,
+            case_dir, database_path, searchdocs, dir_structure, case_info,
+            allrun_reference, mesh_type, mesh_commands or [], user_requirement,
+        )
+        allrun_pool.shutdown(wait=False)
+
     if generation_mode == "parallel_no_context":
         print("<generation_mode>parallel_no_context (no cross-file context)</generation_mode>")
         from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -227,6 +267,27 @@ def initial_write(
 
         written_files.extend([r for r in results if r is not None])
 
+    elif generation_mode == "tiered_dependency":
+        print("<generation_mode>tiered_dependency (parallel within system / constant / 0 / others)</generation_mode>")
+        from concurrent.futures import ThreadPoolExecutor
+        from itertools import groupby
+
+        # subtasks are sorted by priority, so each tier is a contiguous run. Files in a tier
+        # are generated together and see every file from the earlier tiers as context.
+        completed_count = 0
+        with ThreadPoolExecutor(max_workers=min(32, max(4, len(subtasks)))) as ex:
+            for _, tier_iter in groupby(subtasks, key=compute_priority):
+                tier = list(tier_iter)
+                context = list(written_files)
+                futures = [ex.submit(_generate_one, subtask, context) for subtask in tier]
+                for subtask, fut in zip(tier, futures):
+                    written_files.append(fut.result())
+                    completed_count += 1
+                    _report_progress(
+                        completed_count, total_steps,
+                        f"Generated {subtask['file_name']} in {subtask['folder_name']} (tier)"
+                    )
+
     else:
         print("<generation_mode>sequential_dependency</generation_mode>")
         for idx, subtask in enumerate(subtasks):
@@ -237,15 +298,11 @@ def initial_write(
             written_files.append(foamfile)
             _report_progress(idx + 1, total_steps, f"Generated {file_name} in {folder_name}")
     
-    # Generate Allrun script if database_path is provided
-    if database_path:
-        allrun_result = build_allrun(
-            case_dir, database_path, searchdocs, dir_structure, case_info,
-            allrun_reference, mesh_type, mesh_commands or [], user_requirement,
-            progress_callback=progress_callback,
-            progress_offset=len(subtasks),
-            total_steps=total_steps,
-        )
+    # Collect the Allrun script started above if database_path is provided
+    if allrun_future is not None:
+        allrun_result = allrun_future.result()
+        _report_progress(len(subtasks) + 1, total_steps, "Generated Allrun commands")
+        _report_progress(len(subtasks) + 2, total_steps, "Generated Allrun script")
         written_files.append(FoamfilePydantic(file_name="Allrun", folder_name=case_dir, content=allrun_result["allrun_script"]))
     
     foamfiles = FoamPydantic(list_foamfile=written_files)
@@ -309,26 +366,13 @@ def build_allrun(
         ... )
         >>> print(f"Generated script with {len(result['commands'])} commands")
     """
-    from pydantic import BaseModel, Field
-    from typing import List
-    
     # Parse allrun helper function
     def parse_allrun(text: str) -> str:
-        match = re.search(r'```(.*?)```', text, re.DOTALL)
+        match = _FENCE_RE.search(text)
         return match.group(1).strip() if match else text
     
-    # CommandsPydantic class for structured response
-    class CommandsPydantic(BaseModel):
-        commands: List[str] = Field(description="List of commands")
-    
     # Retrieve commands from file
-    command_path = f"{database_path}/raw/openfoam_commands.txt"
-    try:
-        with open(command_path, 'r') as file:
-            commands = file.readlines()
-        commands = f"[{', '.join([c.strip() for c in commands])}]"
-    except (FileNotFoundError, IOError) as e:
-        raise ValueError(f"Could not read commands file {command_path}: {e}")
+    commands = _load_commands(database_path)
 
     # Handle mesh commands info
     mesh_commands_info = ""
@@ -357,7 +401,11 @@ def build_allrun(
     if mesh_type == "custom_mesh":
         command_user_prompt += f"{mesh_commands_info}\n"
     
-    command_response = global_llm_service.invoke(command_user_prompt, command_system_prompt, pydantic_obj=CommandsPydantic)
+    # The available-commands list leads the prompt and is the same for every case
+    command_response = global_llm_service.invoke(
+        command_user_prompt, command_system_prompt, pydantic_obj=CommandsPydantic,
+        cache_prefix=f"Available OpenFOAM commands for the Allrun script: {commands}\n",
+    )
 
     if progress_callback:
         try:
@@ -372,11 +420,11 @@ def build_allrun(
     print(f"Need {len(command_response.commands)} commands.")
     
     # Get command help from FAISS
-    commands_help = []
-    for command in command_response.commands:
-        command_help = retrieve_faiss("openfoam_command_help", command, topk=searchdocs)
-        commands_help.append(command_help[0]['full_content'])
-    commands_help = "\n".join(commands_help)
+    # One embedding call for the whole command list instead of one per command
+    commands_help = "\n".join(
+        command_help[0]['full_content']
+        for command_help in retrieve_faiss_batch("openfoam_command_help", command_response.commands, topk=searchdocs)
+    )
 
     # Allrun generation system prompt
     allrun_system_prompt = (
@@ -495,7 +543,6 @@ def rewrite_files(
         foamfiles = read_case_foamfiles(case_dir, dir_structure)
     
     from utils import FoamPydantic, FoamfilePydantic  # local import to avoid cycles
-    import re
 
     rewrite_system_prompt = (
         "You are an expert in OpenFOAM simulation and numerical modeling. "
@@ -528,11 +575,17 @@ def rewrite_files(
                 allowed_files.add(file_path.strip().lstrip("./"))
 
     # Prepare updated structures
-    updated_dir = dict(dir_structure) if dir_structure else {}
-    foamfiles_list = []
+    # Copy the file lists too, so the caller's dir_structure is never mutated; the sets
+    # give constant-time membership checks while new files are appended
+    updated_dir = {folder: list(files) for folder, files in (dir_structure or {}).items()}
+    known_files = {folder: set(files) for folder, files in updated_dir.items()}
+    # (folder, file) -> foamfile; a rewritten file is moved to the end, as before
+    foamfiles_by_path = {}
     if foamfiles and hasattr(foamfiles, "list_foamfile") and foamfiles.list_foamfile:
-        foamfiles_list = list(foamfiles.list_foamfile)
+        foamfiles_by_path = {(f.folder_name, f.file_name): f for f in foamfiles.list_foamfile}
 
+    # Most rewrites land in the same few folders; create each one only once
+    created_dirs = set()
     for foamfile in response.list_foamfile:
         rel_path = os.path.join(foamfile.folder_name, foamfile.file_name).replace('\\', '/').lstrip('./')
         if allowed_files and rel_path not in allowed_files:
@@ -540,21 +593,26 @@ def rewrite_files(
             continue
 
         file_path = os.path.join(case_dir, foamfile.folder_name, foamfile.file_name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        save_file(file_path, foamfile.content)
+        folder_path = os.path.dirname(file_path)
+        if folder_path not in created_dirs:
+            os.makedirs(folder_path, exist_ok=True)
+            created_dirs.add(folder_path)
+        # Retry loops often hand back files that did not actually change; skip rewriting those
+        if _matches_on_disk(file_path, foamfile.content):
+            print(f"Unchanged, not rewritten: {file_path}")
+        else:
+            save_file(file_path, foamfile.content, make_dirs=False)
 
-        if foamfile.folder_name not in updated_dir:
-            updated_dir[foamfile.folder_name] = []
-        if foamfile.file_name not in updated_dir[foamfile.folder_name]:
-            updated_dir[foamfile.folder_name].append(foamfile.file_name)
+        folder_files = known_files.setdefault(foamfile.folder_name, set())
+        if foamfile.file_name not in folder_files:
+            folder_files.add(foamfile.file_name)
+            updated_dir.setdefault(foamfile.folder_name, []).append(foamfile.file_name)
 
-        foamfiles_list = [
-            f for f in foamfiles_list
-            if not (f.folder_name == foamfile.folder_name and f.file_name == foamfile.file_name)
-        ]
-        foamfiles_list.append(foamfile)
+        key = (foamfile.folder_name, foamfile.file_name)
+        foamfiles_by_path.pop(key, None)
+        foamfiles_by_path[key] = foamfile
 
-    updated_foamfiles = FoamPydantic(list_foamfile=foamfiles_list)
+    updated_foamfiles = FoamPydantic(list_foamfile=list(foamfiles_by_path.values()))
     return {
         "dir_structure": updated_dir,
         "foamfiles": updated_foamfiles,
@@ -1,11 +1,190 @@
+import ast
+import functools
+import hashlib
+import json
 import os
 import re
 import shutil
 import subprocess
-from typing import Dict, List, Tuple, Any
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple, Any, Optional
 from pydantic import BaseModel, Field
 from utils import save_file
 from . import global_llm_service
+try:
+    # google-re2 gives linear-time DFA scanning; optional, falls back to the stdlib engine.
+    import re2 as _boundary_re_engine
+except ImportError:
+    _boundary_re_engine = re
+
+
+# Number of trailing output lines kept from OpenFOAM mesh utilities. checkMesh can print
+# MBs of per-cell diagnostics on large meshes; only the summary at the end is parsed.
+_TAIL_LINES = 1024
+
+# Background worker for LLM calls that can overlap a running subprocess (e.g. the
+# controlDict request while generate_mesh.py runs).
+_LLM_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mesh-llm")
+
+
+def _run_and_tail(
+    cmd: List[str],
+    cwd: str,
+    max_lines: int = _TAIL_LINES,
+    stop_pattern: Optional[re.Pattern] = None,
+) -> Tuple[int, str, str, Optional[re.Match]]:
+    """Run a command and return (returncode, stdout_tail, stderr_tail, stop_match).
+
+    Only the last ``max_lines`` lines of each stream are kept, so memory stays bounded
+    regardless of how much the tool prints. stderr is drained on a helper thread to
+    avoid pipe deadlocks. If ``stop_pattern`` matches a stdout line, the process is
+    killed right away and the match is returned; the caller then owns the result.
+    """
+    stderr_tail: deque = deque(maxlen=max_lines)
+    stdout_tail: deque = deque(maxlen=max_lines)
+    stop_match = None
+    # Popen's context manager closes the pipes and reaps the process on every path
+    with subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1 << 16) as process:
+        stderr_reader = threading.Thread(target=stderr_tail.extend, args=(process.stderr,), daemon=True)
+        stderr_reader.start()
+        try:
+            for line in process.stdout:
+                stdout_tail.append(line)
+                if stop_pattern is not None:
+                    stop_match = stop_pattern.search(line)
+                    if stop_match:
+                        if process.poll() is None:
+                            process.kill()
+                        break
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            stderr_reader.join()
+        return_code = process.wait()
+    return return_code, "".join(stdout_tail), "".join(stderr_tail), stop_match
+
+
+def _run_checked(cmd: List[str], cwd: str) -> str:
+    """Like ``subprocess.run(cmd, check=True)`` but only keeps the output tail. Returns stdout."""
+    return_code, stdout_tail, stderr_tail, _ = _run_and_tail(cmd, cwd)
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd, output=stdout_tail, stderr=stderr_tail)
+    return stdout_tail
+
+
+# checkMesh prints exactly one of these summaries once all checks have run.
+_CHECKMESH_SUMMARY_RE = re.compile(r"Mesh OK\.|Failed (\d+) mesh checks")
+
+# gmshToFoam only needs a syntactically valid controlDict; the solver name is the
+# sole requirement-dependent field, so a template covers the custom-mesh path.
+_CONTROLDICT_TEMPLATE = """FoamFile
+{{
+    version     2.0;
+    format      ascii;
+    class       dictionary;
+    object      controlDict;
+}}
+
+application     {application};
+
+startFrom       startTime;
+
+startTime       0;
+
+stopAt          endTime;
+
+endTime         1;
+
+deltaT          1;
+
+writeControl    timeStep;
+
+writeInterval   1;
+"""
+
+_SOLVER_NAME_RE = re.compile(
+    r"\b(simpleFoam|pimpleFoam|pisoFoam|icoFoam|rhoSimpleFoam|rhoPimpleFoam|rhoCentralFoam|"
+    r"buoyantSimpleFoam|buoyantPimpleFoam|interFoam|multiphaseInterFoam|compressibleInterFoam|"
+    r"potentialFoam|scalarTransportFoam|laplacianFoam|sonicFoam|reactingFoam|chtMultiRegionFoam|"
+    r"SRFSimpleFoam|SRFPimpleFoam|porousSimpleFoam|shallowWaterFoam|dnsFoam|solidDisplacementFoam)\b"
+)
+
+
+def _render_controldict(user_requirement: str) -> str:
+    """Fill the controlDict template with the solver named in the requirement (default simpleFoam)."""
+    match = _SOLVER_NAME_RE.search(user_requirement or "")
+    return _CONTROLDICT_TEMPLATE.format(application=match.group(1) if match else "simpleFoam")
+
+
+def _run_checkmesh(case_dir: str) -> Tuple[Optional[int], str]:
+    """Run checkMesh and stop reading as soon as its summary line appears.
+
+    Returns (failed_checks, output_tail): 0 for "Mesh OK.", N for "Failed N mesh checks",
+    None when no summary was printed. Raises CalledProcessError if checkMesh exits
+    non-zero without a summary.
+    """
+    cmd = ["checkMesh"]
+    return_code, stdout_tail, stderr_tail, summary = _run_and_tail(cmd, case_dir, stop_pattern=_CHECKMESH_SUMMARY_RE)
+    if summary is not None:
+        return int(summary.group(1) or 0), stdout_tail
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd, output=stdout_tail, stderr=stderr_tail)
+    return None, stdout_tail
+
+
+def _make_case_subdirs(case_dir: str, *names: str) -> List[str]:
+    """Create the given top-level folders of a case (if missing) and return their paths.
+
+    ``case_dir`` is opened once and the folders are created relative to that handle,
+    instead of re-resolving the full path for every ``os.makedirs`` call.
+    """
+    if os.mkdir in os.supports_dir_fd:
+        case_fd = os.open(case_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            for name in names:
+                try:
+                    os.mkdir(name, dir_fd=case_fd)
+                except FileExistsError:
+                    pass
+        finally:
+            os.close(case_fd)
+    else:
+        for name in names:
+            os.makedirs(os.path.join(case_dir, name), exist_ok=True)
+    return [os.path.join(case_dir, name) for name in names]
+
+
+def _touch(path: str) -> None:
+    """Create (or truncate) an empty sentinel file such as ``<case>.foam`` with a bare syscall."""
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+
+
+def _stage_mesh_file(src: str, dst: str) -> None:
+    """Place ``src`` at ``dst`` without copying bytes when possible.
+
+    Hard-links when both paths are on the same filesystem (mesh files are only read
+    by gmshToFoam), otherwise falls back to a regular copy. ``dst`` is replaced
+    atomically and left alone when it already is ``src`` (e.g. on a rerun).
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
 
 
 def copy_custom_mesh(custom_mesh_path: str, user_requirement: str, case_dir: str) -> Dict[str, Any]:
@@ -18,7 +197,7 @@ def copy_custom_mesh(custom_mesh_path: str, user_requirement: str, case_dir: str
     
     Args:
         custom_mesh_path (str): Path to the custom mesh file (.msh format)
-        user_requirement (str): User requirements for generating controlDict
+        user_requirement (str): User requirements; the solver named here fills the controlDict
         case_dir (str): Directory path where the case files will be created
     
     Returns:
@@ -48,44 +227,33 @@ def copy_custom_mesh(custom_mesh_path: str, user_requirement: str, case_dir: str
     error_logs: List[str] = []
     if not custom_mesh_path:
         return {"mesh_info": None, "mesh_commands": [], "error_logs": ["No custom mesh path provided"]}
-    if not os.path.exists(custom_mesh_path):
+    try:
+        os.stat(custom_mesh_path)
+    except FileNotFoundError:
         return {"mesh_info": None, "mesh_commands": [], "error_logs": [f"Custom mesh not found: {custom_mesh_path}"]}
 
     mesh_in_case_dir = os.path.join(case_dir, "geometry.msh")
-    shutil.copy2(custom_mesh_path, mesh_in_case_dir)
+    _stage_mesh_file(custom_mesh_path, mesh_in_case_dir)
 
-    constant_dir = os.path.join(case_dir, "constant")
-    system_dir = os.path.join(case_dir, "system")
-    os.makedirs(constant_dir, exist_ok=True)
-    os.makedirs(system_dir, exist_ok=True)
+    constant_dir, system_dir = _make_case_subdirs(case_dir, "constant", "system")
 
-    controldict_prompt = (
-        f"<user_requirements>{user_requirement}</user_requirements>\n"
-        "Please create a basic controlDict file for mesh conversion. "
-        "The file should include only the essential settings needed for gmshToFoam to work. "
-        "IMPORTANT: Return ONLY the complete controlDict file content without any additional text."
-    )
-    # Use global llm instance
-    controldict_content = global_llm_service.invoke(controldict_prompt, (
-        "You are an expert in OpenFOAM simulation setup. "
-        "Create a minimal controlDict for gmshToFoam."
-    )).strip()
-    if controldict_content:
-        save_file(os.path.join(system_dir, "controlDict"), controldict_content)
+    # gmshToFoam only needs a minimal controlDict, so render it locally instead of asking the LLM
+    save_file(os.path.join(system_dir, "controlDict"), _render_controldict(user_requirement))
 
     # Convert mesh
     try:
-        result = subprocess.run(["gmshToFoam", "geometry.msh"], cwd=case_dir, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        _run_checked(["gmshToFoam", "geometry.msh"], case_dir)
     except subprocess.CalledProcessError as e:
         return {"mesh_info": None, "mesh_commands": [], "error_logs": [f"gmshToFoam failed: {e.stderr}"]}
 
     polyMesh_dir = os.path.join(constant_dir, "polyMesh")
-    if not os.path.exists(polyMesh_dir):
+    try:
+        os.stat(polyMesh_dir)
+    except FileNotFoundError:
         return {"mesh_info": None, "mesh_commands": [], "error_logs": ["polyMesh directory not created"]}
 
     foam_file = os.path.join(case_dir, f"{os.path.basename(case_dir)}.foam")
-    with open(foam_file, 'w') as f:
-        pass
+    _touch(foam_file)
 
     return {
         "mesh_info": {
@@ -139,128 +307,36 @@ def prepare_standard_mesh(user_requirement: str, case_dir: str) -> Dict[str, Any
 
 # ====================== GMSH mesh generation ======================
 
-# Prompts used by LLM interactions for mesh-related steps
-BOUNDARY_SYSTEM_PROMPT = (
-    "You are an expert in OpenFOAM mesh processing and simulations. "
-    "Your role is to analyze and modify boundary conditions in OpenFOAM polyMesh boundary file. "
-    "You understand both 2D and 3D simulations and know how to properly set boundary conditions. "
-    "For 2D simulations, you know which boundaries should be set to 'empty' type and 'empty' physicalType. "
-    "You are precise and only return the exact boundary file content without any additional text or explanations. "
-    "IMPORTANT: Only change the specified boundary to 'empty' type and leave all other boundaries exactly as they are."
-)
+# Prompts used by LLM interactions for mesh-related steps. They live in mesh_prompts.json
+# and are loaded on first use, so runs that never generate a mesh do not pay for them.
+_PROMPTS_PATH = Path(__file__).resolve().parent / "mesh_prompts.json"
 
-CONTROLDICT_SYSTEM_PROMPT = (
-    "You are an expert in OpenFOAM simulation setup. "
-    "Your role is to create a basic controlDict file for mesh conversion. "
-    "You understand the minimal requirements needed for gmshToFoam to work. "
-    "You are precise and only return the exact controlDict file content without any additional text or explanations."
-)
 
-GMSH_PYTHON_SYSTEM_PROMPT = (
-    "You are an expert in GMSH Python API and OpenFOAM mesh generation. "
-    "Your role is to create Python code that uses the GMSH library to generate meshes based on user requirements. "
-    "You understand: "
-    "- GMSH Python API for geometry creation "
-    "- How to create points, lines, surfaces, and volumes programmatically "
-    "- How to assign physical groups for OpenFOAM compatibility "
-    "- How to control mesh sizing and refinement "
-    "- How to handle 2D and 3D geometries "
-    "You can: "
-    "- Create complex geometries using GMSH Python API "
-    "- Set up proper boundary conditions for OpenFOAM "
-    "- Implement mesh refinement strategies "
-    "- Generate 3D meshes with correct boundary assignments "
-    "CRITICAL REQUIREMENTS: "
-    "- Always generate 3D meshes for OpenFOAM simulations "
-    "- Set mesh sizes and generate 3D mesh: gmsh.model.mesh.generate(3) "
-    "- AFTER 3D mesh generation, identify surfaces using gmsh.model.getEntities(2) "
-    "- Use gmsh.model.getBoundingBox(dim, tag) to analyze surface positions and categorize them "
-    "- Do not use gmsh.model.getCenterOfMass(dim, tag) function to analyze surface positions "
-    "- Create 2D physical groups based on spatial analysis, not during geometry creation "
-    "- Use user-specified boundary names "
-    "- Create physical groups for all surfaces and the volume domain "
-    "- Set gmsh.option.setNumber('Mesh.MshFileVersion', 2.2) for OpenFOAM compatibility "
-    "- Save as 'geometry.msh' and finalize GMSH "
-    "- Use proper coordinate system - define z_min and z_max variables and use them consistently for boundary detection "
-    "- Use bounding box coordinates (x_min, y_min, z_min, x_max, y_max, z_max) directly for boundary detection, NOT center points "
-    "- Ensure all boundary types (example: inlet, outlet, top, bottom, cylinder, frontAndBack) are properly detected and created "
-    "CRITICAL ORDER: Create geometry then Extrude then Synchronize then Generate mesh then create physical groups "
-    "CRITICAL: Use bounding box coordinates consistently for ALL boundaries - do not mix center points and bounding box coordinates in the same boundary detection logic "
-    "MOST CRITICAL: NEVER create physical groups before mesh generation. Always create them AFTER gmsh.model.mesh.generate(3) "
-    "MOST CRITICAL: Physical groups created before mesh generation will reference wrong surface tags after extrusion and meshing "
-    "CRITICAL FACE DETECTION: "
-    "- For thin boundary surfaces: use abs(zmin - zmax) < tol AND (abs(zmin - z_min) < tol OR abs(zmin - z_max) < tol) "
-    "- Thin surfaces at z_min and z_max are boundary surfaces that need physical groups "
-    "- Use tolerance tol = 1e-6 for floating point comparisons "
-    "- Ensure ALL user-specified boundaries are detected and assigned to physical groups "
-    "IMPORTANT: Use your expertise to create robust, adaptable code that can handle various geometry types and boundary conditions."
-)
+@functools.cache
+def _load_prompts() -> Dict[str, str]:
+    with open(_PROMPTS_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-BOUNDARY_EXTRACTION_SYSTEM_PROMPT = (
-    "You are an expert in OpenFOAM mesh generation and boundary condition analysis. "
-    "Your role is to extract boundary names from user requirements for mesh generation. "
-    "You understand: "
-    "- Common OpenFOAM boundary types (inlet, outlet, wall, cylinder, etc.) "
-    "- How to identify boundary names from natural language descriptions "
-    "- The importance of accurate boundary identification for mesh generation "
-    "You can: "
-    "- Parse user requirements to identify all mentioned boundaries "
-    "- Distinguish between boundary names and other geometric terms "
-    "- Handle variations in boundary naming conventions "
-    "- Return a clean list of boundary names "
-    "IMPORTANT: Return ONLY a comma-separated list of boundary names without any additional text, explanations, or formatting. "
-    "Example: inlet,outlet,wall,cylinder "
-    "If no boundaries are mentioned, return an empty string."
-)
 
-GMSH_PYTHON_ERROR_CORRECTION_SYSTEM_PROMPT = (
-    "You are an expert in debugging GMSH Python API code. "
-    "Your role is to analyze GMSH Python errors and fix the corresponding code. "
-    "You understand common GMSH Python API errors including: "
-    "- Geometry definition errors (invalid points, lines, surfaces, volumes) "
-    "- Physical group assignment issues "
-    "- Mesh generation problems "
-    "- API usage errors "
-    "- Missing boundary definitions that cause OpenFOAM conversion failures "
-    "- Mesh quality issues detected by checkMesh (skewness, aspect ratio, etc.) "
-    "You can identify the root cause of errors and provide corrected Python code. "
-    "CRITICAL REQUIREMENTS: "
-    "- Ensure 3D mesh generation for OpenFOAM compatibility "
-    "- Use proper spatial analysis for boundary identification "
-    "- Create complete physical group definitions for surfaces and volumes "
-    "- Handle various geometry types and boundary conditions "
-    "- When missing boundaries are mentioned, ensure they are properly defined "
-    "- Do not use gmsh.model.getCenterOfMass(dim, tag) function to analyze surface positions "
-    "- Address mesh quality issues by adjusting mesh sizing and refinement strategies "
-    "CRITICAL CORRECTIONS: "
-    "- Use proper coordinate system variables (z_min, z_max) for boundary detection "
-    "- Use bounding box coordinates directly for boundary detection, NOT center points "
-    "- Ensure all boundary types are detected: (example: inlet, outlet, top, bottom, cylinder, frontAndBack) "
-    "- Check boundary detection logic for coordinate system consistency "
-    "- Verify that extrusion creates proper 3D geometry with all expected surfaces "
-    "- For mesh quality issues: adjust mesh sizes, add refinement zones, improve geometry definition "
-    "CRITICAL ORDER: Create geometry then Extrude then Synchronize then Generate mesh then create physical groups "
-    "CRITICAL: Use bounding box coordinates consistently for ALL boundary types - do not mix center points and bounding box coordinates in the same boundary detection logic "
-    "MOST CRITICAL FIX: If boundaries are missing after gmshToFoam, move ALL physical group creation to AFTER gmsh.model.mesh.generate(3) "
-    "MOST CRITICAL FIX: Physical groups created before mesh generation will have wrong surface tag references "
-    "CRITICAL FACE DETECTION FIXES: "
-    "- Fix thin boundary detection: use abs(zmin - zmax) < tol AND (abs(zmin - z_min) < tol OR abs(zmin - z_max) < tol) "
-    "- Use tolerance tol = 1e-6 for all floating point comparisons "
-    "- Ensure thin surfaces at z_min and z_max are properly classified as boundary surfaces "
-    "- Check that ALL user-specified boundaries are detected and assigned to physical groups "
-    "MESH QUALITY FIXES: "
-    "- For high skewness: refine mesh in problematic areas, adjust element sizes "
-    "- For poor aspect ratio: use smaller mesh sizes, add refinement zones "
-    "- For non-orthogonality: improve geometry definition, use structured meshing where possible "
-    "- For negative volume elements: check geometry validity, ensure proper surface orientation "
-    "IMPORTANT: Use your expertise to diagnose and fix issues while maintaining code adaptability for different problems."
-)
+def _prompt(name: str) -> str:
+    return _load_prompts()[name]
+
+
+def __getattr__(name: str) -> str:
+    # Keep the historical *_SYSTEM_PROMPT module attributes available lazily.
+    if name.endswith("_SYSTEM_PROMPT"):
+        try:
+            return _prompt(name)
+        except KeyError:
+            pass
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class GMSHPythonCode(BaseModel):
     python_code: str = Field(description="Complete Python code using GMSH library")
     mesh_type: str = Field(description="Type of mesh (2D or 3D)")
     geometry_type: str = Field(description="Type of geometry being created")
+    boundary_names: List[str] = Field(description="Boundary names requested in the user requirements, used as physical group names")
 
 
 class GMSHPythonCorrection(BaseModel):
@@ -268,43 +344,202 @@ class GMSHPythonCorrection(BaseModel):
     error_analysis: str = Field(description="Analysis of the error and what was fixed")
 
 
+@functools.lru_cache(maxsize=256)
+def _extract_boundary_names_cached(user_requirement: str) -> Tuple[str, ...]:
+    """LLM boundary-name extraction, memoized per requirement text for the process lifetime."""
+    extraction_prompt = (
+        f"<user_requirements>{user_requirement}</user_requirements>\n"
+        "Please extract all boundary names mentioned in the user requirements. "
+        "Look for terms like inlet, outlet, wall, cylinder, top, bottom, front, back, side, etc. "
+        "Focus on boundaries that would need to be defined in the mesh for OpenFOAM simulation. "
+        "Return ONLY a comma-separated list of boundary names without any additional text."
+    )
+    boundary_response = global_llm_service.invoke(extraction_prompt, _prompt("BOUNDARY_EXTRACTION_SYSTEM_PROMPT")).strip()
+    return tuple(name.strip() for name in boundary_response.split(',') if name.strip())
+
+
+# Well-known boundary words; a requirement that mentions one of them without naming the
+# patch explicitly still needs the LLM to decide what the patch is called
+_BOUNDARY_KEYWORD_RE = re.compile(
+    r'\b(inlet|outlet|wall|walls|cylinder|top|bottom|front|back|side|frontAndBack|atmosphere)\b',
+    re.IGNORECASE,
+)
+# Explicit patch names: quoted identifiers ('movingWall', "inlet") or "patch X" / "boundary X"
+_QUOTED_NAME_RE = re.compile(r"""(?<![\w'"])['"]([A-Za-z_]\w*)['"](?![\w'"])""")
+_NAMED_PATCH_RE = re.compile(r'\b(?:patch|boundary)\s+(?:named\s+|called\s+)?([A-Za-z_]\w*)', re.IGNORECASE)
+_NOT_PATCH_NAMES = {
+    "condition", "conditions", "layer", "layers", "type", "types", "name", "names", "named",
+    "called", "is", "are", "of", "and", "the", "a", "an", "with", "at", "on", "in", "for",
+    "face", "faces", "surface", "surfaces", "patch", "patches", "boundary", "boundaries",
+}
+# Patch types and boundary conditions: quoted, they describe a patch rather than name it
+_PATCH_TYPE_WORDS = {
+    "empty", "wall", "patch", "symmetry", "symmetryPlane", "wedge", "cyclic", "cyclicAMI",
+    "processor", "zeroGradient", "fixedValue", "noSlip", "slip", "freestream",
+    "freestreamVelocity", "freestreamPressure", "inletOutlet", "totalPressure",
+}
+
+
+def _explicit_boundary_names(user_requirement: str) -> Optional[List[str]]:
+    """Offline pass: patch names the requirement spells out, in order of appearance.
+
+    Returns None (ask the LLM) unless every boundary the requirement mentions was named
+    explicitly; "top wall" or "front and back faces" without a patch name, or a quoted
+    patch type such as 'empty', leave the naming to the LLM.
+    """
+    text = user_requirement or ""
+    names: List[str] = []
+    for match in _QUOTED_NAME_RE.finditer(text):
+        name = match.group(1)
+        if name in _PATCH_TYPE_WORDS:
+            return None
+        if name not in names:
+            names.append(name)
+    for match in _NAMED_PATCH_RE.finditer(text):
+        name = match.group(1)
+        if name.lower() not in _NOT_PATCH_NAMES and name not in _PATCH_TYPE_WORDS and name not in names:
+            names.append(name)
+    if not names:
+        return None
+    lowered = [name.lower() for name in names]
+    for match in _BOUNDARY_KEYWORD_RE.finditer(text):
+        keyword = match.group(1).lower()
+        if not any(keyword in name for name in lowered):
+            return None
+    return names
+
+
 def extract_boundary_names_from_requirements(user_requirement: str) -> List[str]:
+    # Requirements that name every patch explicitly do not need the LLM
+    explicit_boundaries = _explicit_boundary_names(user_requirement)
+    if explicit_boundaries is not None:
+        return explicit_boundaries
     try:
-        extraction_prompt = (
-            f"<user_requirements>{user_requirement}</user_requirements>\n"
-            "Please extract all boundary names mentioned in the user requirements. "
-            "Look for terms like inlet, outlet, wall, cylinder, top, bottom, front, back, side, etc. "
-            "Focus on boundaries that would need to be defined in the mesh for OpenFOAM simulation. "
-            "Return ONLY a comma-separated list of boundary names without any additional text."
-        )
-        boundary_response = global_llm_service.invoke(extraction_prompt, BOUNDARY_EXTRACTION_SYSTEM_PROMPT).strip()
-        if boundary_response:
-            return [name.strip() for name in boundary_response.split(',') if name.strip()]
-        return []
+        return list(_extract_boundary_names_cached(user_requirement))
     except Exception:
-        # Fallback keyword search
+        # Fallback keyword search (not cached, so a transient LLM failure is retried next time)
         requirement_lower = (user_requirement or "").lower()
         boundary_keywords = ['inlet', 'outlet', 'wall', 'cylinder', 'top', 'bottom', 'front', 'back', 'side']
         return [k for k in boundary_keywords if k in requirement_lower]
 
 
+_BOUNDARY_RE = _boundary_re_engine.compile(r'(\w+)\s*\{')
+
+
+def _parse_boundary_names(content: str) -> List[str]:
+    """Return the patch names declared in a polyMesh boundary file."""
+    found_boundaries = _BOUNDARY_RE.findall(content)
+    boundary_keywords = ['type', 'physicalType', 'nFaces', 'startFace', 'FoamFile']
+    return [b for b in found_boundaries if b not in boundary_keywords]
+
+
 def check_boundary_file_for_missing_boundaries(boundary_file_path: str, expected_boundaries: List[str]):
-    if not os.path.exists(boundary_file_path):
-        return False, expected_boundaries, []
     try:
         with open(boundary_file_path, 'r') as f:
             content = f.read()
-        boundary_pattern = r'(\w+)\s*\{'
-        found_boundaries = re.findall(boundary_pattern, content)
-        boundary_keywords = ['type', 'physicalType', 'nFaces', 'startFace', 'FoamFile']
-        found_boundaries = [b for b in found_boundaries if b not in boundary_keywords]
+        found_boundaries = _parse_boundary_names(content)
         missing_boundaries = [b for b in expected_boundaries if b not in found_boundaries]
         return len(missing_boundaries) == 0, missing_boundaries, found_boundaries
     except Exception:
         return False, expected_boundaries, []
 
 
-def _correct_gmsh_python_code(user_requirement: str, current_code: str, error_output: str, found_boundaries=None, expected_boundaries=None):
+# Only the model-level API is moved; geo/occ physical groups take effect at synchronize()
+_PHYSICAL_GROUP_CALLS = {"gmsh.model.addPhysicalGroup", "gmsh.model.setPhysicalName"}
+_KERNEL_PHYSICAL_GROUP_CALLS = {
+    f"gmsh.model.{kernel}.{name}" for kernel in ("geo", "occ") for name in ("addPhysicalGroup", "setPhysicalName")
+}
+
+
+def _gmsh_model_call(node: ast.AST) -> Optional[str]:
+    """Return the dotted name of a ``gmsh.model[.mesh|.geo|.occ].<name>(...)`` call node."""
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+        return None
+    owner = ast.unparse(node.func.value)
+    if owner in ("gmsh.model", "gmsh.model.mesh", "gmsh.model.geo", "gmsh.model.occ"):
+        return f"{owner}.{node.func.attr}"
+    return None
+
+
+def _is_physical_group_stmt(stmt: ast.stmt) -> bool:
+    """True if every call in ``stmt`` is a physical-group call (and there is at least one)."""
+    calls = [_gmsh_model_call(n) for n in ast.walk(stmt) if isinstance(n, ast.Call)]
+    return bool(calls) and all(c in _PHYSICAL_GROUP_CALLS for c in calls)
+
+
+def _move_physical_groups_after_generate(code: str) -> Optional[str]:
+    """Locally apply the most common boundary-mismatch fix without an LLM call.
+
+    Physical groups defined before ``gmsh.model.mesh.generate(...)`` reference stale
+    surface tags, so gmshToFoam drops them. Statements that only create physical
+    groups and sit before ``generate`` in the same block are moved to right after it.
+    Returns None when the pattern is absent or the rewrite cannot be done safely, which
+    includes scripts using ``gmsh.model.geo``/``gmsh.model.occ`` physical groups.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    if any(_gmsh_model_call(n) in _KERNEL_PHYSICAL_GROUP_CALLS for n in ast.walk(tree)):
+        return None
+
+    changed = False
+    for block_owner in ast.walk(tree):
+        body = getattr(block_owner, "body", None)
+        if not isinstance(body, list):
+            continue
+        generate_idx = next(
+            (i for i, stmt in enumerate(body)
+             if isinstance(stmt, ast.Expr) and _gmsh_model_call(stmt.value) == "gmsh.model.mesh.generate"),
+            None,
+        )
+        if generate_idx is None:
+            continue
+        moved = [stmt for stmt in body[:generate_idx] if _is_physical_group_stmt(stmt)]
+        if not moved:
+            continue
+        moved_names = {
+            n.id for stmt in moved for n in ast.walk(stmt)
+            if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)
+        }
+        kept = [stmt for stmt in body[:generate_idx] if not any(stmt is m for m in moved)]
+        first_moved = body.index(moved[0])
+        # Bail out if anything left in place reads a name the moved statements assign.
+        if any(
+            isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load) and n.id in moved_names
+            for stmt in body[first_moved:generate_idx] if not any(stmt is m for m in moved)
+            for n in ast.walk(stmt)
+        ):
+            return None
+        body[:] = kept + [body[generate_idx]] + moved + body[generate_idx + 1:]
+        changed = True
+
+    if not changed:
+        return None
+    rewritten = ast.unparse(tree)
+    try:
+        compile(rewritten, "generate_mesh.py", "exec")
+    except SyntaxError:
+        return None
+    return rewritten
+
+
+def _code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def _unseen_code(code: str, attempted_hashes: Optional[set]) -> Optional[str]:
+    """Return ``code`` unless it was already attempted; a repeat means the corrector is stuck."""
+    if attempted_hashes is None:
+        return code
+    digest = _code_hash(code)
+    if digest in attempted_hashes:
+        return None
+    attempted_hashes.add(digest)
+    return code
+
+
+def _correct_gmsh_python_code(user_requirement: str, current_code: str, error_output: str, found_boundaries=None, expected_boundaries=None, attempted_hashes: Optional[set] = None):
     try:
         is_boundary_mismatch = isinstance(error_output, str) and "Boundary mismatch after gmshToFoam" in error_output
         boundary_info = ""
@@ -323,6 +558,9 @@ def _correct_gmsh_python_code(user_requirement: str, current_code: str, error_ou
                 "</boundary_mismatch>"
             )
         if is_boundary_mismatch:
+            rewritten = _move_physical_groups_after_generate(current_code)
+            if rewritten is not None:
+                return _unseen_code(rewritten, attempted_hashes)
             correction_prompt = (
                 f"<user_requirements>{user_requirement}</user_requirements>{boundary_info}\n"
                 f"<current_python_code>{current_code}</current_python_code>\n"
@@ -347,32 +585,64 @@ def _correct_gmsh_python_code(user_requirement: str, current_code: str, error_ou
             )
         correction_response = global_llm_service.invoke(
             correction_prompt,
-            GMSH_PYTHON_ERROR_CORRECTION_SYSTEM_PROMPT,
+            _prompt("GMSH_PYTHON_ERROR_CORRECTION_SYSTEM_PROMPT"),
             pydantic_obj=GMSHPythonCorrection,
         )
         if correction_response.corrected_code:
-            return correction_response.corrected_code
+            return _unseen_code(correction_response.corrected_code, attempted_hashes)
     except Exception:
         pass
     return None
 
 
-def run_checkmesh_and_correct(case_dir: str, python_file: str, max_loop: int, current_loop: int) -> Tuple[bool, bool, str]:
-    """Run checkMesh and optionally generate corrected code. Returns (success, should_continue, corrected_code)."""
+def _write_llm_controldict(controldict_prompt: str, controldict_file: str) -> str:
+    """Ask the LLM for a controlDict and write it; runs on ``_LLM_POOL`` so the write overlaps the mesh script too."""
+    controldict_content = global_llm_service.invoke(controldict_prompt, _prompt("CONTROLDICT_SYSTEM_PROMPT")).strip()  # type: ignore
+    if controldict_content:
+        save_file(controldict_file, controldict_content)
+    return controldict_content
+
+
+@functools.lru_cache(maxsize=64)
+def _rewrite_boundary_file(user_requirement: str, boundary_content: str) -> str:
+    """LLM rewrite of polyMesh/boundary (wall/empty types), memoized per (requirement, file content).
+
+    Retries that change the GMSH code often reproduce the exact same boundary file, so an
+    identical file is only sent to the LLM once.
+    """
+    boundary_prompt = (
+        f"<user_requirements>{user_requirement}</user_requirements>\n"
+        f"<boundary_file_content>{boundary_content}</boundary_file_content>\n"
+        "Please analyze the user requirements and boundary file content. "
+        "Identify which boundary is to be modified based on the boundaries mentioned in the user requirements."
+        "If this is a 2D simulation, modify ONLY the appropriate boundary to 'empty' type and 'empty' physicalType. "
+        "Based on the no slip boundaries mentioned in the user requirements, modify the appropriate boundary/boundaries to type 'wall' and physicalType 'wall'. "
+        "If this is a 3D simulation, only modify the appropriate boundary/boundaries to type 'wall' and physicalType 'wall'."
+        "IMPORTANT: Do not change any other boundaries - leave them exactly as they are. "
+        "Return ONLY the complete boundary file content with any necessary modifications. No additional text."
+    )
+    return global_llm_service.invoke(boundary_prompt, _prompt("BOUNDARY_SYSTEM_PROMPT")).strip()  # type: ignore
+
+
+def run_checkmesh_and_correct(case_dir: str, python_file: str, max_loop: int, current_loop: int, attempted_hashes: Optional[set] = None, current_code: Optional[str] = None) -> Tuple[bool, bool, str]:
+    """Run checkMesh and optionally generate corrected code. Returns (success, should_continue, corrected_code).
+
+    ``current_code`` is the script last written to ``python_file``; it is only read back
+    from disk when the caller does not pass it.
+    """
     try:
-        result = subprocess.run(["checkMesh"], cwd=case_dir, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        checkmesh_output = result.stdout
-        if "Failed" in checkmesh_output and "mesh checks" in checkmesh_output:
-            failed_match = re.search(r"Failed (\d+) mesh checks", checkmesh_output)
-            if failed_match and current_loop < max_loop:
-                with open(python_file, 'r') as f:
-                    current_code = f.read()
+        failed_checks, checkmesh_output = _run_checkmesh(case_dir)
+        if failed_checks:
+            if current_loop < max_loop:
+                if current_code is None:
+                    with open(python_file, 'r') as f:
+                        current_code = f.read()
                 checkmesh_error = (
                     f"checkMesh output:\n{checkmesh_output}\n"
                     "Please analyze the checkMesh output and correct the mesh generation code. "
                     "Common issues include poor mesh quality, geometry issues, boundary layer problems, and boundary naming mismatch."
                 )
-                corrected_code = _correct_gmsh_python_code("", current_code, checkmesh_error)
+                corrected_code = _correct_gmsh_python_code("", current_code, checkmesh_error, attempted_hashes=attempted_hashes)
                 if corrected_code:
                     return False, True, corrected_code
             return False, False, ""
@@ -433,54 +703,83 @@ def handle_gmsh_mesh(
         shutil.rmtree(case_dir)
     os.makedirs(case_dir)
 
+    # Every path below is fixed for the case, so resolve them once rather than per retry.
     python_file = os.path.join(case_dir, "generate_mesh.py")
     msh_file = os.path.join(case_dir, "geometry.msh")
+    constant_dir, system_dir = _make_case_subdirs(case_dir, "constant", "system")
+    controldict_file = os.path.join(system_dir, "controlDict")
+    polyMesh_dir = os.path.join(constant_dir, "polyMesh")
+    boundary_file = os.path.join(polyMesh_dir, "boundary")
+    foam_file = os.path.join(case_dir, f"{os.path.basename(case_dir)}.foam")
 
-    expected_boundaries = extract_boundary_names_from_requirements(user_requirement)
+    # Filled from the code-generation response; a separate extraction call is only
+    # made when the response does not carry any boundary names.
+    expected_boundaries = None
+
+    # The prompts only depend on the user requirement, so build them once; keeping
+    # the prefix identical across retries also keeps provider prompt caches warm.
+    requirement_block = f"<user_requirements>{user_requirement}</user_requirements>\n"
+    python_prompt = (
+        requirement_block
+        + "Please create Python code using the GMSH library to generate a mesh based on the user requirements. "
+        "Use boundary names specified in user requirements (e.g., 'inlet', 'outlet', 'wall', 'cylinder', etc.). "
+        "Also list every boundary name mentioned in the user requirements in boundary_names. "
+        "Return ONLY the complete Python code without any additional text."
+    )
+    controldict_prompt = (
+        requirement_block
+        + "Please create a basic controlDict file for mesh conversion. "
+        "The file should include only the essential settings needed for gmshToFoam to work. "
+        "IMPORTANT: Return ONLY the complete controlDict file content without any additional text."
+    )
 
     gmsh_python_current_loop = 0
     corrected_python_code = None
+    # Hashes of every script already run, so a correction that reproduces one of them
+    # is rejected instead of burning another gmsh/gmshToFoam/checkMesh round.
+    attempted_code_hashes: set = set()
+    controldict_future = None
+    # Whatever was last passed to save_file(python_file, ...), so retries never re-read it.
+    last_written_code: Optional[str] = None
+    last_mismatch_signature = None
 
     while gmsh_python_current_loop < max_loop:
         gmsh_python_current_loop += 1
         should_generate_new_code = corrected_python_code is None
         try:
             if should_generate_new_code:
-                missing_boundary_info = ""
-                python_prompt = (
-                    f"<user_requirements>{user_requirement}</user_requirements>\n"
-                    f"{missing_boundary_info}"
-                    "Please create Python code using the GMSH library to generate a mesh based on the user requirements. "
-                    "Use boundary names specified in user requirements (e.g., 'inlet', 'outlet', 'wall', 'cylinder', etc.). "
-                    "Return ONLY the complete Python code without any additional text."
-                )
-                python_response = global_llm_service.invoke(python_prompt, GMSH_PYTHON_SYSTEM_PROMPT, pydantic_obj=GMSHPythonCode)  # type: ignore
+                python_response = global_llm_service.invoke(python_prompt, _prompt("GMSH_PYTHON_SYSTEM_PROMPT"), pydantic_obj=GMSHPythonCode)  # type: ignore
                 if not python_response.python_code:
                     if gmsh_python_current_loop >= max_loop:
                         return {"mesh_info": None, "mesh_commands": [], "mesh_file_destination": None, "error_logs": error_logs}
                     continue
                 python_code_to_use = python_response.python_code
                 geometry_type = python_response.geometry_type
+                if expected_boundaries is None and python_response.boundary_names:
+                    expected_boundaries = [name.strip() for name in python_response.boundary_names if name.strip()] or None
             else:
                 python_code_to_use = corrected_python_code
                 geometry_type = "corrected"
 
+            attempted_code_hashes.add(_code_hash(python_code_to_use))
             save_file(python_file, python_code_to_use)
+            last_written_code = python_code_to_use
             corrected_python_code = None
 
-            process = subprocess.Popen(["python", python_file], cwd=case_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1, universal_newlines=True)
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-            return_code = process.wait()
-            stderr_output = process.stderr.read()
+            # The controlDict does not depend on the generated code, so request it while
+            # the mesh script runs and only wait for it right before gmshToFoam. Its prompt
+            # never changes across retries, so one request serves every iteration unless it failed.
+            if controldict_future is None or (controldict_future.done() and controldict_future.exception() is not None):
+                controldict_future = _LLM_POOL.submit(_write_llm_controldict, controldict_prompt, controldict_file)
+
+            mesh_cmd = ["python", python_file]
+            return_code, _, stderr_output, _ = _run_and_tail(mesh_cmd, case_dir)
             if return_code != 0:
-                raise subprocess.CalledProcessError(return_code, process.args, stderr=stderr_output)
+                raise subprocess.CalledProcessError(return_code, mesh_cmd, stderr=stderr_output)
 
             if not os.path.exists(msh_file):
                 if stderr_output and gmsh_python_current_loop < max_loop:
-                    corrected = _correct_gmsh_python_code(user_requirement, python_code_to_use, stderr_output)
+                    corrected = _correct_gmsh_python_code(user_requirement, last_written_code, stderr_output, attempted_hashes=attempted_code_hashes)
                     if corrected:
                         corrected_python_code = corrected
                         continue
@@ -488,45 +787,44 @@ def handle_gmsh_mesh(
                     return {"mesh_info": None, "mesh_commands": [], "mesh_file_destination": None, "error_logs": error_logs}
                 continue
 
-            # Preprocess for OpenFOAM conversion
-            constant_dir = os.path.join(case_dir, "constant")
-            system_dir = os.path.join(case_dir, "system")
-            os.makedirs(constant_dir, exist_ok=True)
-            os.makedirs(system_dir, exist_ok=True)
-            controldict_prompt = (
-                f"<user_requirements>{user_requirement}</user_requirements>\n"
-                "Please create a basic controlDict file for mesh conversion. "
-                "The file should include only the essential settings needed for gmshToFoam to work. "
-                "IMPORTANT: Return ONLY the complete controlDict file content without any additional text."
-            )
-            controldict_content = global_llm_service.invoke(controldict_prompt, CONTROLDICT_SYSTEM_PROMPT).strip()  # type: ignore
-            if controldict_content:
-                save_file(os.path.join(system_dir, "controlDict"), controldict_content)
-
-            result = subprocess.run(["gmshToFoam", "geometry.msh"], cwd=case_dir, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            polyMesh_dir = os.path.join(constant_dir, "polyMesh")
-            if not os.path.exists(polyMesh_dir):
-                raise subprocess.CalledProcessError(1, "gmshToFoam", "polyMesh directory not created")
-
-            boundary_file = os.path.join(polyMesh_dir, "boundary")
-            if os.path.exists(boundary_file):
-                all_present, missing_boundaries, found_boundaries = check_boundary_file_for_missing_boundaries(boundary_file, expected_boundaries)
-                if set(found_boundaries) != set(expected_boundaries):
-                    if gmsh_python_current_loop < max_loop:
-                        with open(python_file, 'r') as f:
-                            current_code = f.read()
-                        boundary_error = (
-                            f"Boundary mismatch after gmshToFoam. Found boundaries: {found_boundaries}. Expected boundaries: {expected_boundaries}. "
-                        )
-                        corrected = _correct_gmsh_python_code(user_requirement, current_code, boundary_error, found_boundaries, expected_boundaries)
-                        if corrected:
-                            corrected_python_code = corrected
-                            continue
-                    else:
+            # Preprocess for OpenFOAM conversion: system/controlDict must be on disk before gmshToFoam
+            controldict_future.result()
+
+            _run_checked(["gmshToFoam", "geometry.msh"], case_dir)
+            # Read the boundary file once; only stat polyMesh/ when it is missing.
+            try:
+                with open(boundary_file, 'r') as f:
+                    boundary_content = f.read()
+            except FileNotFoundError:
+                boundary_content = None
+                if not os.path.isdir(polyMesh_dir):
+                    raise subprocess.CalledProcessError(1, "gmshToFoam", "polyMesh directory not created")
+
+            if boundary_content is not None:
+                if expected_boundaries is None:
+                    expected_boundaries = extract_boundary_names_from_requirements(user_requirement)
+                found_boundaries = _parse_boundary_names(boundary_content)
+                mismatch_signature = (frozenset(found_boundaries), frozenset(expected_boundaries))
+                if mismatch_signature[0] != mismatch_signature[1]:
+                    if mismatch_signature == last_mismatch_signature:
+                        # Same wrong boundary set twice in a row: the corrections are not converging.
+                        error_logs.append(f"Boundary mismatch repeated after correction: found {found_boundaries}, expected {expected_boundaries}")
                         return {"mesh_info": None, "mesh_commands": [], "mesh_file_destination": None, "error_logs": error_logs}
+                    last_mismatch_signature = mismatch_signature
+                    if gmsh_python_current_loop >= max_loop:
+                        return {"mesh_info": None, "mesh_commands": [], "mesh_file_destination": None, "error_logs": error_logs}
+                    boundary_error = (
+                        f"Boundary mismatch after gmshToFoam. Found boundaries: {found_boundaries}. Expected boundaries: {expected_boundaries}. "
+                    )
+                    corrected = _correct_gmsh_python_code(user_requirement, last_written_code, boundary_error, found_boundaries, expected_boundaries, attempted_code_hashes)
+                    if corrected:
+                        corrected_python_code = corrected
+                        continue
+                    # No new script (the LLM call failed or repeated an earlier attempt):
+                    # keep this mesh and let checkMesh and the later steps judge it
 
                 # Mesh quality check and possible correction
-                ok, should_continue, corrected = run_checkmesh_and_correct(case_dir, python_file, max_loop, gmsh_python_current_loop)  # type: ignore
+                ok, should_continue, corrected = run_checkmesh_and_correct(case_dir, python_file, max_loop, gmsh_python_current_loop, attempted_code_hashes, last_written_code)  # type: ignore
                 if not ok:
                     if should_continue and corrected:
                         corrected_python_code = corrected
@@ -536,27 +834,12 @@ def handle_gmsh_mesh(
                     return {"mesh_info": None, "mesh_commands": [], "mesh_file_destination": None, "error_logs": error_logs}
 
                 # Boundary update as per requirements
-                with open(boundary_file, 'r') as f:
-                    boundary_content = f.read()
-                boundary_prompt = (
-                    f"<user_requirements>{user_requirement}</user_requirements>\n"
-                    f"<boundary_file_content>{boundary_content}</boundary_file_content>\n"
-                    "Please analyze the user requirements and boundary file content. "
-                    "Identify which boundary is to be modified based on the boundaries mentioned in the user requirements."
-                    "If this is a 2D simulation, modify ONLY the appropriate boundary to 'empty' type and 'empty' physicalType. "
-                    "Based on the no slip boundaries mentioned in the user requirements, modify the appropriate boundary/boundaries to type 'wall' and physicalType 'wall'. "
-                    "If this is a 3D simulation, only modify the appropriate boundary/boundaries to type 'wall' and physicalType 'wall'."
-                    "IMPORTANT: Do not change any other boundaries - leave them exactly as they are. "
-                    "Return ONLY the complete boundary file content with any necessary modifications. No additional text."
-                )
-                updated_boundary_content = global_llm_service.invoke(boundary_prompt, BOUNDARY_SYSTEM_PROMPT).strip()  # type: ignore
+                updated_boundary_content = _rewrite_boundary_file(user_requirement, boundary_content)
                 if updated_boundary_content:
                     save_file(boundary_file, updated_boundary_content)
 
             # Create .foam file and return info
-            foam_file = os.path.join(case_dir, f"{os.path.basename(case_dir)}.foam")
-            with open(foam_file, 'w'):
-                pass
+            _touch(foam_file)
 
             mesh_commands: List[str] = []
             return {
@@ -572,11 +855,9 @@ def handle_gmsh_mesh(
                 "error_logs": error_logs,
             }
         except subprocess.CalledProcessError as e:
-            if gmsh_python_current_loop < max_loop:
+            if gmsh_python_current_loop < max_loop and last_written_code is not None:
                 try:
-                    with open(python_file, 'r') as f:
-                        current_code = f.read()
-                    corrected = _correct_gmsh_python_code(user_requirement, current_code, e.stderr)
+                    corrected = _correct_gmsh_python_code(user_requirement, last_written_code, e.stderr, attempted_hashes=attempted_code_hashes)
                     if corrected:
                         corrected_python_code = corrected
                         continue
@@ -1,5 +1,6 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Tuple, Optional
 from pathlib import Path
 from pydantic import BaseModel, Field
@@ -183,6 +184,10 @@ def _build_advice(
     return global_llm_service.invoke(user_prompt, sys_prompt, pydantic_obj=SimilarCaseAdviceModel)
 
 
+_TRIPLE_NEWLINE_RE = re.compile(r"\n{3}")
+_DIRECTORY_STRUCTURE_RE = re.compile(r"<directory_structure>(.*?)</directory_structure>", re.DOTALL)
+
+
 def retrieve_references(case_name: str,
                         case_solver: str,
                         case_domain: str,
@@ -210,15 +215,20 @@ def retrieve_references(case_name: str,
     ranked = _rerank_candidates(domain_matched, case_solver)
     selected = ranked[0]
 
+    # The advice LLM call only needs the ranking, so it runs while the selected case is
+    # parsed and the allrun scripts are retrieved
+    advice_pool = ThreadPoolExecutor(max_workers=1)
+    advice_future = advice_pool.submit(_build_advice, user_requirement, case_info, selected, ranked)
+    advice_pool.shutdown(wait=False)
+
     # Use details from the same candidate (no re-query on structure text)
     faiss_detailed = selected.get("full_content", "")
-    faiss_detailed = re.sub(r"\n{3}", "\n", faiss_detailed)
+    faiss_detailed = _TRIPLE_NEWLINE_RE.sub("\n", faiss_detailed)
 
-    m = re.search(r"<directory_structure>(.*?)</directory_structure>", faiss_detailed, re.DOTALL)
+    m = _DIRECTORY_STRUCTURE_RE.search(faiss_detailed)
     if not m:
         print("Warning: No directory_structure found in selected similar case details.")
-        advice = _build_advice(user_requirement, case_info, selected, ranked)
-        return "", "", "", "", advice
+        return "", "", "", "", advice_future.result()
     dir_structure = m.group(1).strip()
     dir_counts = parse_directory_structure(dir_structure)
     dir_counts_str = ',\n'.join([f"There are {count} files in Directory: {directory}" for directory, count in dir_counts.items()])
@@ -230,8 +240,7 @@ def retrieve_references(case_name: str,
     for idx, item in enumerate(faiss_allrun):
         allrun_reference += f"<similar_case_{idx + 1}>{item['full_content']}</similar_case_{idx + 1}>\n\n\n"
 
-    advice = _build_advice(user_requirement, case_info, selected, ranked)
-    return faiss_detailed, dir_structure, dir_counts_str, allrun_reference, advice
+    return faiss_detailed, dir_structure, dir_counts_str, allrun_reference, advice_future.result()
 
 
 def decompose_to_subtasks(user_requirement: str, dir_structure: str, dir_counts_str: str) -> List[Dict]:
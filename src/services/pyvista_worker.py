@@ -0,0 +1,178 @@
+"""Long-lived interpreter that runs visualization scripts with PyVista/VTK imported once.
+
+Run as a standalone script (never imported through the ``services`` package, so the
+LLM service is not constructed here). Protocol, one JSON object per line:
+
+    request  (stdin):  {"script_path": "...", "cwd": "...", "foam_file": "..." | null,
+                        "stderr_path": "..." | null}
+    response (stdout): {"returncode": int, "stdout": str, "stderr": str}
+
+When ``foam_file`` is given, the case is read once (latest time) and handed to each
+script as the global ``preloaded_data``, with its external surface as
+``preloaded_surface``; both are recomputed only after new results appear.
+
+File descriptor 1 is pointed at stderr right after startup so native VTK output can
+never interleave with the protocol stream; responses go through a private dup. For each
+request, fds 1 and 2 are pointed at ``stderr_path`` (or a temporary file), and whatever
+native code wrote there is appended to the reply's ``stderr``. The caller can still read
+that file if the worker dies mid-script.
+"""
+import contextlib
+import io
+import json
+import os
+import runpy
+import sys
+import tempfile
+import traceback
+
+# foam path -> (results stamp, dataset, surface); only the most recent case is kept
+_preloaded = {}
+
+
+def _results_stamp(case_dir: str) -> tuple:
+    """(name, mtime_ns, size) of every file in the latest time directory and constant/polyMesh.
+
+    Directory mtimes only change when entries are added or removed, so a solver rewriting
+    a field file in place would otherwise keep serving the stale dataset.
+    """
+    latest = None
+    with os.scandir(case_dir) as entries:
+        for entry in entries:
+            try:
+                value = float(entry.name)
+            except ValueError:
+                continue
+            if entry.is_dir() and (latest is None or value > latest[0]):
+                latest = (value, entry.path)
+    stamp = []
+    for directory in ([latest[1]] if latest else []) + [os.path.join(case_dir, "constant", "polyMesh")]:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        st = entry.stat()
+                        stamp.append((entry.path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            continue
+    return tuple(sorted(stamp))
+
+
+def _preload(foam_path: str):
+    stamp = _results_stamp(os.path.dirname(foam_path))
+    cached = _preloaded.get(foam_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1], cached[2]
+    import pyvista as pv
+
+    reader = pv.OpenFOAMReader(foam_path)
+    try:
+        reader.set_active_time_value(reader.time_values[-1])
+    except Exception:
+        pass
+    data = reader.read()
+    # Only the skin is visible in a screenshot; extracting it once keeps every later
+    # render independent of the volume cell count
+    try:
+        mesh = data.combine() if hasattr(data, "combine") else data
+        surface = mesh.extract_surface()
+    except Exception:
+        surface = None
+    _preloaded.clear()
+    _preloaded[foam_path] = (stamp, data, surface)
+    return data, surface
+
+
+def _prefer_egl() -> None:
+    """On a headless host, render through EGL (GPU) when VTK was built with it.
+
+    Otherwise VTK needs Xvfb and falls back to software (llvmpipe) rendering.
+    """
+    if os.environ.get("DISPLAY"):
+        return
+    try:
+        from vtkmodules.vtkRenderingOpenGL2 import vtkEGLRenderWindow  # noqa: F401
+    except Exception:
+        return
+    os.environ.setdefault("VTK_DEFAULT_OPENGL_WINDOW", "vtkEGLRenderWindow")
+
+
+@contextlib.contextmanager
+def _capture_native_output(stderr_path: str = None):
+    """Point fds 1 and 2 at a file for the duration; yields a callable returning its text."""
+    capture = open(stderr_path, "w+b") if stderr_path else tempfile.TemporaryFile()
+    saved = os.dup(2)
+    sys.stderr.flush()
+    os.dup2(capture.fileno(), 1)
+    os.dup2(capture.fileno(), 2)
+
+    def read() -> str:
+        capture.seek(0)
+        return capture.read().decode("utf-8", errors="replace")
+
+    try:
+        yield read
+    finally:
+        os.dup2(saved, 1)
+        os.dup2(saved, 2)
+        os.close(saved)
+        capture.close()
+
+
+def _run(script_path: str, cwd: str, foam_file: str = None, stderr_path: str = None) -> dict:
+    out, err = io.StringIO(), io.StringIO()
+    returncode = 0
+    native = ""
+    previous_cwd = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with _capture_native_output(stderr_path) as read_native, \
+                contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            init_globals = {}
+            if foam_file:
+                try:
+                    data, surface = _preload(os.path.join(cwd, foam_file))
+                    # Shallow copies: scripts may add arrays without touching the cached datasets
+                    init_globals["preloaded_data"] = data.copy(deep=False)
+                    if surface is not None:
+                        init_globals["preloaded_surface"] = surface.copy(deep=False)
+                except Exception:
+                    pass
+            try:
+                runpy.run_path(script_path, init_globals=init_globals, run_name="__main__")
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    returncode = e.code if isinstance(e.code, int) else 1
+                    if not isinstance(e.code, int):
+                        print(e.code, file=sys.stderr)
+            except BaseException:
+                returncode = 1
+                traceback.print_exc()
+            native = read_native()
+    finally:
+        os.chdir(previous_cwd)
+    return {"returncode": returncode, "stdout": out.getvalue(), "stderr": err.getvalue() + native}
+
+
+def main() -> None:
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    os.environ.setdefault("PYVISTA_OFF_SCREEN", "true")
+    try:
+        import pyvista  # noqa: F401  # warm the VTK import for every later script
+    except Exception:
+        pass
+    _prefer_egl()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        response = _run(request["script_path"], request["cwd"], request.get("foam_file"), request.get("stderr_path"))
+        protocol.write(json.dumps(response) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from typing import List, Optional, Tuple, Any
+import hashlib
+from typing import Dict, List, Optional, Tuple, Any
 from pydantic import BaseModel, Field
 from . import global_llm_service
 
@@ -24,15 +25,46 @@ REVIEWER_SYSTEM_PROMPT = (
 )
 
 
-def review_error_logs(
+def foamfile_hashes(foamfiles: Any) -> Dict[str, str]:
+    """Return {"folder/file": blake2b digest} for every file in a FoamPydantic; {} otherwise."""
+    return {
+        f"{f.folder_name}/{f.file_name}": hashlib.blake2b(f.content.encode("utf-8"), digest_size=16).hexdigest()
+        for f in getattr(foamfiles, "list_foamfile", None) or []
+    }
+
+
+def serialize_foamfiles_delta(foamfiles: Any, prior_hashes: Dict[str, str], error_logs: List[str]) -> str:
+    """Serialize only the foam files that changed since ``prior_hashes`` was taken.
+
+    Unchanged files are listed by path so the prompt stays aware of them, except those
+    named in the current error logs, which are always inlined in full.
+    """
+    files = getattr(foamfiles, "list_foamfile", None)
+    if not files or not prior_hashes:
+        return str(foamfiles)
+    current_hashes = foamfile_hashes(foamfiles)
+    error_text = str(error_logs)
+    inlined, unchanged = [], []
+    for f in files:
+        path = f"{f.folder_name}/{f.file_name}"
+        if prior_hashes.get(path) != current_hashes[path] or path in error_text:
+            inlined.append(f)
+        else:
+            unchanged.append(path)
+    text = str(type(foamfiles)(list_foamfile=inlined))
+    if unchanged:
+        text += f"\n<unchanged_since_last_review>{', '.join(unchanged)}</unchanged_since_last_review>"
+    return text
+
+
+def _build_reviewer_user_prompt(
     tutorial_reference: str,
-    foamfiles: Any,
+    foamfiles_text: str,
     error_logs: List[str],
     user_requirement: str,
-    similar_case_advice: Optional[Any] = None,
-    history_text: Optional[List[str]] = None,
-) -> Tuple[str, List[str]]:
-    """Stateless reviewer: returns (review_analysis, updated_history)."""
+    similar_case_advice: Optional[Any],
+    history_text: Optional[List[str]],
+) -> str:
     advice_text = ""
     if isinstance(similar_case_advice, dict):
         advice_text = (
@@ -46,28 +78,26 @@ def review_error_logs(
         advice_text = f"<similar_case_advice>{similar_case_advice}</similar_case_advice>\n"
 
     if history_text:
-        reviewer_user_prompt = (
+        return (
             f"<similar_case_reference>{tutorial_reference}</similar_case_reference>\n"
             f"{advice_text}"
-            f"<foamfiles>{str(foamfiles)}</foamfiles>\n"
+            f"<foamfiles>{foamfiles_text}</foamfiles>\n"
             f"<current_error_logs>{error_logs}</current_error_logs>\n"
             f"<history>\n{chr(10).join(history_text)}\n</history>\n\n"
             f"<user_requirement>{user_requirement}</user_requirement>\n\n"
             f"I have modified the files according to your previous suggestions. If the error persists, please provide further guidance. Make sure your suggestions adhere to user requirements and do not contradict it. Also, please consider the previous attempts and try a different approach."
         )
-    else:
-        reviewer_user_prompt = (
-            f"<similar_case_reference>{tutorial_reference}</similar_case_reference>\n"
-            f"{advice_text}"
-            f"<foamfiles>{str(foamfiles)}</foamfiles>\n"
-            f"<error_logs>{error_logs}</error_logs>\n"
-            f"<user_requirement>{user_requirement}</user_requirement>\n"
-            "Please review the error logs and provide guidance on how to resolve the reported errors. Make sure your suggestions adhere to user requirements and do not contradict it."
-        )
+    return (
+        f"<similar_case_reference>{tutorial_reference}</similar_case_reference>\n"
+        f"{advice_text}"
+        f"<foamfiles>{foamfiles_text}</foamfiles>\n"
+        f"<error_logs>{error_logs}</error_logs>\n"
+        f"<user_requirement>{user_requirement}</user_requirement>\n"
+        "Please review the error logs and provide guidance on how to resolve the reported errors. Make sure your suggestions adhere to user requirements and do not contradict it."
+    )
 
-    review_response = global_llm_service.invoke(reviewer_user_prompt, REVIEWER_SYSTEM_PROMPT)
-    review_content = review_response
 
+def _append_review_attempt(history_text: Optional[List[str]], error_logs: List[str], review_content: str) -> List[str]:
     updated_history = list(history_text) if history_text else []
     current_attempt = [
         f"<Attempt {len(updated_history)//4 + 1}>\n",
@@ -76,7 +106,72 @@ def review_error_logs(
         f"</Attempt>\n",
     ]
     updated_history.extend(current_attempt)
-    return review_content, updated_history
+    return updated_history
+
+
+def review_error_logs(
+    tutorial_reference: str,
+    foamfiles: Any,
+    error_logs: List[str],
+    user_requirement: str,
+    similar_case_advice: Optional[Any] = None,
+    history_text: Optional[List[str]] = None,
+    foamfiles_text: Optional[str] = None,
+) -> Tuple[str, List[str]]:
+    """Stateless reviewer: returns (review_analysis, updated_history).
+
+    ``foamfiles_text`` is an already serialized ``foamfiles``; pass it to avoid
+    re-stringifying the same files for every prompt built from them.
+    """
+    if foamfiles_text is None:
+        foamfiles_text = str(foamfiles)
+    reviewer_user_prompt = _build_reviewer_user_prompt(
+        tutorial_reference, foamfiles_text, error_logs, user_requirement, similar_case_advice, history_text
+    )
+
+    review_response = global_llm_service.invoke(reviewer_user_prompt, REVIEWER_SYSTEM_PROMPT)
+    review_content = review_response
+
+    return review_content, _append_review_attempt(history_text, error_logs, review_content)
+
+
+REVIEW_AND_PLAN_SYSTEM_PROMPT = (
+    REVIEWER_SYSTEM_PROMPT
+    + " In the same response, also turn your analysis into a minimal rewrite plan in target_files: "
+    "one entry per file to modify, with its relative path (e.g. system/fvSchemes or 0/U) and the concrete changes "
+    "as short plain text actions separated by semicolons. "
+    "Do not include parentheses, backticks, or quote characters inside changes text, and do not include run steps; only file edits."
+)
+
+
+class ReviewWithPlan(BaseModel):
+    review_analysis: str = Field(description="Diagnosis of the errors and guidance on how to resolve them")
+    target_files: List[PlannedFileChange] = Field(description="Files to modify and required changes")
+
+
+def review_and_plan(
+    tutorial_reference: str,
+    foamfiles: Any,
+    error_logs: List[str],
+    user_requirement: str,
+    similar_case_advice: Optional[Any] = None,
+    history_text: Optional[List[str]] = None,
+    foamfiles_text: Optional[str] = None,
+) -> Tuple[str, List[str], dict]:
+    """Review and rewrite plan in one structured LLM call.
+
+    Equivalent to ``review_error_logs`` followed by ``generate_rewrite_plan``, but the
+    shared context (foam files, logs, requirement) is sent and prefilled only once.
+    Returns (review_analysis, updated_history, rewrite_plan).
+    """
+    if foamfiles_text is None:
+        foamfiles_text = str(foamfiles)
+    user_prompt = _build_reviewer_user_prompt(
+        tutorial_reference, foamfiles_text, error_logs, user_requirement, similar_case_advice, history_text
+    )
+    response = global_llm_service.invoke(user_prompt, REVIEW_AND_PLAN_SYSTEM_PROMPT, pydantic_obj=ReviewWithPlan)
+    rewrite_plan = RewritePlan(target_files=response.target_files).model_dump()
+    return response.review_analysis, _append_review_attempt(history_text, error_logs, response.review_analysis), rewrite_plan
 
 
 def generate_rewrite_plan(
@@ -84,8 +179,11 @@ def generate_rewrite_plan(
     error_logs: List[str],
     review_analysis: str,
     user_requirement: str,
+    foamfiles_text: Optional[str] = None,
 ) -> dict:
     """Generate a minimal, explicit rewrite plan for downstream rewrite step."""
+    if foamfiles_text is None:
+        foamfiles_text = str(foamfiles)
     planner_system_prompt = (
         "You are an OpenFOAM debugging planner. "
         "Given current foam files, error logs and reviewer analysis, create a minimal rewrite plan. "
@@ -100,7 +198,7 @@ def generate_rewrite_plan(
     )
 
     planner_user_prompt = (
-        f"<foamfiles>{str(foamfiles)}</foamfiles>\n"
+        f"<foamfiles>{foamfiles_text}</foamfiles>\n"
         f"<error_logs>{error_logs}</error_logs>\n"
         f"<review_analysis>{review_analysis}</review_analysis>\n"
         f"<user_requirement>{user_requirement}</user_requirement>\n"
@@ -1,11 +1,29 @@
+import ast
+import atexit
+import functools
+import hashlib
+import json
 import os
+import re
+import select
 import sys
 import subprocess
-from typing import List, Tuple, Optional
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Optional
 from utils import save_file
 from . import global_llm_service
 
 
+@functools.lru_cache(maxsize=256)
+def _foam_file_path(case_dir: str) -> Tuple[str, str]:
+    """(foam file name, absolute foam file path) for a case directory."""
+    case_dir = os.path.abspath(case_dir)
+    foam = f"{os.path.basename(case_dir)}.foam"
+    return foam, os.path.join(case_dir, foam)
+
+
 def ensure_foam_file(case_dir: str) -> str:
     """
     Ensure a .foam file exists in the case directory for OpenFOAM visualization.
@@ -27,21 +45,73 @@ def ensure_foam_file(case_dir: str) -> str:
         >>> foam_name = ensure_foam_file("/path/to/case")
         >>> print(f"Foam file: {foam_name}")  # "case.foam"
     """
-    case_dir = os.path.abspath(case_dir)
-    foam = f"{os.path.basename(case_dir)}.foam"
-    foam_path = os.path.join(case_dir, foam)
+    foam, foam_path = _foam_file_path(case_dir)
     
-    # Create or update the .foam file
-    if not os.path.exists(foam_path):
-        with open(foam_path, 'w') as f:
-            pass
-    else:
-        # Update timestamp if file exists
-        os.utime(foam_path, None)
+    # Create the .foam file, or update its timestamp if it already exists
+    Path(foam_path).touch(exist_ok=True)
     
     return foam
 
 
+# Run-specific noise in error output (timestamps, memory addresses, temp paths) that
+# would make otherwise identical prompts miss the LLM response cache.
+_ERROR_NOISE_PATTERNS = (
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"), "<timestamp>"),
+    (re.compile(r"\b0x[0-9a-fA-F]{6,}\b"), "<addr>"),
+    (re.compile(r"/tmp/[\w.-]+"), "<tmp>"),
+)
+
+
+def normalize_errors(errors: List[str], case_dir: Optional[str] = None) -> List[str]:
+    """Strip run-specific details from error text so repeated failures produce identical prompts."""
+    normalized = []
+    for err in errors:
+        text = str(err)
+        if case_dir:
+            text = text.replace(os.path.abspath(case_dir), "<case_dir>")
+        for pattern, placeholder in _ERROR_NOISE_PATTERNS:
+            text = pattern.sub(placeholder, text)
+        normalized.append(text)
+    return normalized
+
+
+_EXCEPTION_LINE_RE = re.compile(r"^\w+(?:Error|Exception|Exit)\b.*$", re.MULTILINE)
+
+
+def summarize_errors(
+    errors: List[str],
+    case_dir: Optional[str] = None,
+    context_lines: int = 20,
+    max_chars: int = 6000,
+) -> str:
+    """Condense error logs for a prompt: last exception plus context per log, deduplicated.
+
+    Each log keeps the final ``SomethingError: ...`` line and up to ``context_lines`` lines
+    before it (or its last ``context_lines`` lines if no exception line is found). Lines
+    repeated across logs, such as identical tracebacks, are kept once, and the result is
+    cut to its last ``max_chars`` characters so retries don't grow the prompt.
+    """
+    lines: List[str] = []
+    for text in normalize_errors(errors, case_dir):
+        log_lines = text.splitlines()
+        matches = list(_EXCEPTION_LINE_RE.finditer(text))
+        if matches:
+            end = text.count("\n", 0, matches[-1].start()) + 1
+        else:
+            end = len(log_lines)
+        lines.extend(line for line in log_lines[max(end - context_lines - 1, 0):end] if line.strip())
+    summary = "\n".join(dict.fromkeys(lines))
+    return summary[-max_chars:]
+
+
+_PRELOADED_DATA_HINT = (
+    "If a global variable named `preloaded_data` exists (check with globals().get('preloaded_data')), "
+    "it is the dataset already read from the .foam file at the latest time; use it instead of reading the file again. "
+    "If `preloaded_surface` exists, it is the combined external surface of that dataset with the same fields; "
+    "render it instead of the volume mesh unless slices, clips or streamlines are required."
+)
+
+
 def generate_pyvista_script(
     case_dir: str,
     foam_file: str,
@@ -79,17 +149,184 @@ def generate_pyvista_script(
     system_prompt = (
         "You are an expert in OpenFOAM post-processing and PyVista Python scripting. "
         "Generate a PyVista script that loads the .foam file, renders geometry colored by requested field, uses coolwarm colormap, and saves a PNG. "
+        f"{_PRELOADED_DATA_HINT} "
         "Return ONLY Python code, no markdown."
     )
     prompt = (
         f"<case_directory>{case_dir}</case_directory>\n"
         f"<foam_file>{foam_file}</foam_file>\n"
         f"<visualization_requirements>{user_requirement}</visualization_requirements>\n"
-        f"<previous_errors>{previous_errors}</previous_errors>\n"
+        f"<previous_errors>{summarize_errors(previous_errors, case_dir)}</previous_errors>\n"
     )
     return global_llm_service.invoke(prompt, system_prompt)
 
 
+_PYVISTA_WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyvista_worker.py")
+
+
+class PyVistaWorker:
+    """Persistent interpreter (``pyvista_worker.py``) that keeps PyVista/VTK imported.
+
+    Each script still runs in its own ``__main__`` namespace and working directory, but
+    the ~1-3s interpreter + VTK startup is paid once instead of on every attempt. The
+    worker is started lazily, and killed and restarted after a timeout or crash.
+    """
+
+    def __init__(self):
+        self._proc: Optional[subprocess.Popen] = None
+        self._last_returncode: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                [sys.executable, _PYVISTA_WORKER_PATH],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        return self._proc
+
+    def run(self, script_path: str, cwd: str, timeout_s: int, foam_file: Optional[str] = None) -> Tuple[int, str, str]:
+        """Run ``script_path`` in the worker; returns (returncode, stdout, stderr).
+
+        With ``foam_file``, the script gets the case's latest-time dataset and its external
+        surface as the globals ``preloaded_data`` and ``preloaded_surface``, computed once
+        and reused until new results are written.
+
+        Native output (VTK errors written to fd 2) is part of ``stderr``. If the worker dies
+        mid-script, its exit code (negative for a signal) and that output are returned; the
+        script is not re-run.
+
+        Raises subprocess.TimeoutExpired if the script does not finish in ``timeout_s``.
+        """
+        with self._lock:
+            proc = self._ensure_started()
+            cmd = [sys.executable, script_path]
+            fd, stderr_path = tempfile.mkstemp(prefix="pyvista_stderr_", suffix=".log")
+            os.close(fd)
+            try:
+                request = {"script_path": script_path, "cwd": cwd, "foam_file": foam_file, "stderr_path": stderr_path}
+                proc.stdin.write(json.dumps(request) + "\n")
+                proc.stdin.flush()
+                ready, _, _ = select.select([proc.stdout], [], [], timeout_s)
+                line = proc.stdout.readline() if ready else ""
+                try:
+                    response = json.loads(line) if line else None
+                except ValueError:
+                    response = None
+                if response is not None:
+                    return response["returncode"], response["stdout"], response["stderr"]
+                self.close()
+                native = Path(stderr_path).read_text(errors="replace")
+                if not ready:
+                    raise subprocess.TimeoutExpired(cmd, timeout_s, output="", stderr=native)
+                returncode = self._last_returncode or 1
+                return returncode, "", native + f"PyVista worker exited unexpectedly (return code {returncode})\n"
+            finally:
+                os.unlink(stderr_path)
+
+    def close(self) -> None:
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._last_returncode = self._proc.wait()
+        self._proc = None
+
+
+_pyvista_worker = PyVistaWorker()
+atexit.register(_pyvista_worker.close)
+
+
+# stderr lines after which a render cannot succeed; the process is killed right away. VTK
+# reader errors are often recoverable (the script may still save an image), and a crash
+# ends the process on its own with a negative return code.
+_FATAL_STDERR_RE = re.compile(r"\bMemoryError\b")
+
+
+def _run_streaming(cmd: List[str], cwd: str, timeout_s: int) -> None:
+    """Like ``subprocess.run(cmd, check=True, timeout=timeout_s)``, but stderr is read line by
+    line and the process is killed as soon as a line matches ``_FATAL_STDERR_RE``."""
+    process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stdout_chunks: List[str] = []
+    stdout_reader = threading.Thread(target=stdout_chunks.extend, args=(process.stdout,), daemon=True)
+    stdout_reader.start()
+    timed_out = threading.Event()
+
+    def _on_timeout() -> None:
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout_s, _on_timeout)
+    timer.start()
+    stderr_lines: List[str] = []
+    try:
+        for line in process.stderr:
+            stderr_lines.append(line)
+            if _FATAL_STDERR_RE.search(line):
+                process.kill()
+                break
+        return_code = process.wait()
+    finally:
+        timer.cancel()
+    stdout_reader.join()
+    out, err = "".join(stdout_chunks), "".join(stderr_lines)
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout_s, output=out, stderr=err)
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd, output=out, stderr=err)
+
+
+def _execute_script(script_path: str, case_dir: str, timeout_s: int, foam_file: Optional[str] = None) -> None:
+    """Run a script (worker when possible); raises like ``subprocess.run(check=True)``."""
+    cmd = [sys.executable, script_path]
+    # select() only works on pipes on POSIX; elsewhere spawn one interpreter per script
+    if os.name == "posix":
+        try:
+            returncode, out, err = _pyvista_worker.run(script_path, case_dir, timeout_s, foam_file)
+        except OSError:
+            # The worker could not be started or reached; the script has not run
+            pass
+        else:
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, cmd, output=out, stderr=err)
+            return
+    _run_streaming(cmd, case_dir, timeout_s)
+
+
+def validate_script(script: str) -> Tuple[bool, str]:
+    """Cheap static check of a visualization script before spending a render on it.
+
+    The script must parse, load the case (``OpenFOAMReader`` or ``preloaded_data``) and
+    save an image (a ``screenshot`` call or ``screenshot=`` argument).
+    """
+    try:
+        tree = ast.parse(script)
+    except SyntaxError as e:
+        return False, f"Visualization script has a syntax error: {e.msg} (line {e.lineno})"
+
+    loads_case = saves_image = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in ("OpenFOAMReader", "preloaded_data", "preloaded_surface"):
+            loads_case = True
+        elif isinstance(node, ast.Attribute) and node.attr == "OpenFOAMReader":
+            loads_case = True
+        elif isinstance(node, ast.Constant) and node.value in ("preloaded_data", "preloaded_surface"):
+            loads_case = True
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute) and node.func.attr == "screenshot":
+                saves_image = True
+            elif any(kw.arg == "screenshot" for kw in node.keywords):
+                saves_image = True
+    if not loads_case:
+        return False, "Visualization script never loads the case (no OpenFOAMReader or preloaded_data)"
+    if not saves_image:
+        return False, "Visualization script never saves an image (no screenshot call)"
+    return True, ""
+
+
 def run_pyvista_script(
     case_dir: str,
     script: str,
@@ -97,30 +334,36 @@ def run_pyvista_script(
     filename: str = "visualization.py",
     expected_png: Optional[str] = None,
     timeout_s: int = 180,
+    foam_file: Optional[str] = None,
 ) -> Tuple[bool, str, List[str]]:
     """Run a generated visualization script deterministically.
 
     Key behaviors (to avoid flaky bugs):
       - If expected_png is provided, we only consider success if that file exists after execution.
       - Apply a timeout so headless/VTK hangs don't block forever.
+      - Scripts run in the shared PyVistaWorker when possible, so VTK is imported only once.
+      - With foam_file, the worker reads the case once and passes it as ``preloaded_data``.
+      - Scripts failing validate_script are reported without being executed.
     """
     script_path = os.path.join(case_dir, filename)
     save_file(script_path, script)
 
     expected_png_abs = os.path.abspath(os.path.join(case_dir, expected_png)) if expected_png else None
 
+    valid, reason = validate_script(script)
+    if not valid:
+        return False, "", [reason]
+
     try:
-        completed = subprocess.run(
-            [sys.executable, script_path],
-            cwd=case_dir,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=timeout_s,
-        )
+        _execute_script(script_path, case_dir, timeout_s, foam_file)
 
         if expected_png_abs:
-            if os.path.exists(expected_png_abs) and os.path.getsize(expected_png_abs) > 0:
+            # One stat answers both "was it written" and "is it non-empty"
+            try:
+                png_size = os.stat(expected_png_abs).st_size
+            except FileNotFoundError:
+                png_size = 0
+            if png_size > 0:
                 return True, expected_png_abs, []
             return False, "", [
                 "Visualization script executed but expected PNG was not created",
@@ -158,18 +401,171 @@ def run_pyvista_script(
         return False, "", [f"Unexpected error running visualization script: {str(e)}"]
 
 
-def fix_pyvista_script(foam_file: str, original_script: str, error_logs: List[str]) -> str:
+def fix_pyvista_script(foam_file: str, original_script: str, error_logs: List[str], case_dir: Optional[str] = None) -> str:
     system_prompt = (
-        "You are an expert in PyVista visualization. Fix the provided script to load the .foam file, render geometry, and save a PNG with colorbar. Return ONLY Python code."
+        "You are an expert in PyVista visualization. Fix the provided script to load the .foam file, render geometry, and save a PNG with colorbar. "
+        f"{_PRELOADED_DATA_HINT} Return ONLY Python code."
     )
     prompt = (
-        f"<error_logs>{error_logs}</error_logs>\n"
         f"<foam_file>{foam_file}</foam_file>\n"
         f"<original_script>{original_script}</original_script>\n"
+        f"<error_logs>{summarize_errors(error_logs, case_dir)}</error_logs>\n"
     )
     return global_llm_service.invoke(prompt, system_prompt)
 
 
+def _is_time_dir(name: str) -> bool:
+    try:
+        float(name)
+    except ValueError:
+        return False
+    return True
+
+
+def scan_case(case_dir: str, expected_png: str = "visualization.png") -> Optional[Dict[str, Any]]:
+    """Collect what the visualization step needs about a case in one ``os.scandir`` pass.
+
+    Returns None if ``case_dir`` does not exist, otherwise a dict with:
+      - png_stat (Optional[os.stat_result]): stat of ``expected_png`` if present
+      - results_stamp (tuple): (path, mtime_ns, size) of every file in the latest time
+        directory and constant/polyMesh, i.e. the data a render reads
+      - results_mtime_ns (int): newest mtime in ``results_stamp`` (0 if none)
+    """
+    info: Dict[str, Any] = {"png_stat": None}
+    latest_time: Optional[Tuple[float, str]] = None
+    try:
+        entries = os.scandir(case_dir)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    with entries:
+        for entry in entries:
+            if entry.name == expected_png:
+                info["png_stat"] = entry.stat()
+            elif _is_time_dir(entry.name) and entry.is_dir():
+                if latest_time is None or float(entry.name) > latest_time[0]:
+                    latest_time = (float(entry.name), entry.path)
+    # Directory mtimes only change when entries are added or removed, so files rewritten
+    # in place are stamped individually
+    stamp = []
+    for directory in ([latest_time[1]] if latest_time else []) + [os.path.join(case_dir, "constant", "polyMesh")]:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        st = entry.stat()
+                        stamp.append((entry.path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            continue
+    info["results_stamp"] = tuple(sorted(stamp))
+    info["results_mtime_ns"] = max((mtime for _, mtime, _ in stamp), default=0)
+    return info
+
+
+def pyvista_timeout_for_case(case_dir: str, minimum_s: int = 30, maximum_s: int = 300) -> int:
+    """Scale the render timeout with the polyMesh size: 10s per 5 MiB, clamped to [minimum_s, maximum_s].
+
+    Small tutorial cases then fail fast on a hang instead of waiting the full maximum.
+    The floor still covers a cold VTK import in the PyVista worker.
+    """
+    mesh_bytes = 0
+    try:
+        with os.scandir(os.path.join(case_dir, "constant", "polyMesh")) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    mesh_bytes += entry.stat().st_size
+    except OSError:
+        return maximum_s
+    return max(minimum_s, min(maximum_s, 10 * (mesh_bytes // (5 * 1024 * 1024))))
+
+
+def find_cached_visualization(
+    case_dir: str,
+    script: str,
+    *,
+    filename: str = "visualization.py",
+    expected_png: str = "visualization.png",
+    scan: Optional[Dict[str, Any]] = None,
+) -> Optional[str]:
+    """Return the PNG from a previous run of exactly ``script`` if it is still current.
+
+    The artifact is reused only when ``filename`` in ``case_dir`` holds the same script
+    (same foam file, field and output path) and the PNG is newer than every file in the
+    latest time directory and constant/polyMesh, i.e. no results were written after it
+    was rendered. Pass the result of
+    ``scan_case`` as ``scan`` to avoid walking the case directory again.
+    """
+    if scan is None:
+        scan = scan_case(case_dir, expected_png)
+    png_stat = scan["png_stat"] if scan else None
+    if png_stat is None or png_stat.st_size == 0 or scan["results_mtime_ns"] > png_stat.st_mtime_ns:
+        return None
+    try:
+        with open(os.path.join(case_dir, filename), 'r') as f:
+            if f.read() != script:
+                return None
+    except OSError:
+        return None
+    return os.path.abspath(os.path.join(case_dir, expected_png))
+
+
+_TEMPLATE_CASE_DIR = "{{CASE_DIR}}"
+_TEMPLATE_FOAM_FILE = "{{FOAM_FILE}}"
+
+
+def _script_template_path(template_dir: str, solver: str, field: str) -> str:
+    tag = hashlib.sha1(f"{solver}|{field}".encode("utf-8")).hexdigest()[:12]
+    return os.path.join(os.path.expanduser(template_dir), f"{tag}.py")
+
+
+def load_script_template(template_dir: str, solver: str, field: str, case_dir: str, foam_file: str) -> Optional[str]:
+    """Return the last successful LLM script for (solver, field), rewritten for this case.
+
+    Returns None when no template is stored. Reading a template refreshes its mtime,
+    which is what ``store_script_template`` evicts by.
+    """
+    path = _script_template_path(template_dir, solver, field)
+    try:
+        with open(path, 'r') as f:
+            template = f.read()
+        os.utime(path, None)
+    except OSError:
+        return None
+    return template.replace(_TEMPLATE_CASE_DIR, os.path.abspath(case_dir)).replace(_TEMPLATE_FOAM_FILE, foam_file)
+
+
+def store_script_template(
+    template_dir: str,
+    solver: str,
+    field: str,
+    case_dir: str,
+    foam_file: str,
+    script: str,
+    max_templates: int = 64,
+) -> None:
+    """Save a script that rendered successfully as the template for (solver, field).
+
+    Case-specific paths are replaced by placeholders so the script can be replayed on
+    another case. Only the ``max_templates`` most recently used templates are kept.
+    """
+    template_dir = os.path.expanduser(template_dir)
+    template = script.replace(os.path.abspath(case_dir), _TEMPLATE_CASE_DIR).replace(foam_file, _TEMPLATE_FOAM_FILE)
+    try:
+        save_file(_script_template_path(template_dir, solver, field), template)
+        with os.scandir(template_dir) as entries:
+            templates = [entry for entry in entries if entry.name.endswith(".py")]
+        if len(templates) > max_templates:
+            templates.sort(key=lambda entry: entry.stat().st_mtime_ns)
+            for entry in templates[:-max_templates]:
+                os.remove(entry.path)
+    except OSError:
+        pass
+
+
+# Surfaces above this many cells are decimated before rendering by the deterministic script
+_DECIMATE_CELL_THRESHOLD = 2_000_000
+
+
+@functools.lru_cache(maxsize=64)
 def generate_deterministic_pyvista_script(
     *,
     foam_file: str,
@@ -197,35 +593,42 @@ try:
 except Exception:
     pass
 
-try:
-    pv.start_xvfb()
-except Exception:
-    # start_xvfb is optional and may be unavailable
-    pass
+# Xvfb is only needed when VTK is not already rendering off-screen through EGL
+if os.environ.get('VTK_DEFAULT_OPENGL_WINDOW') != 'vtkEGLRenderWindow':
+    try:
+        pv.start_xvfb()
+    except Exception:
+        # start_xvfb is optional and may be unavailable
+        pass
 
 foam_path = os.path.abspath({foam_file!r})
 out_png = os.path.abspath({output_png!r})
 
-reader = pv.OpenFOAMReader(foam_path)
-# Many OpenFOAM readers expose available times; use the last one when present
-try:
-    reader.set_active_time_value(reader.time_values[-1])
-except Exception:
-    pass
-
-data = reader.read()
+# The PyVista worker may already have read the case (latest time) and skinned it for us
+surface = globals().get('preloaded_surface')
+mesh = surface
+if mesh is None:
+    data = globals().get('preloaded_data')
+    if data is None:
+        reader = pv.OpenFOAMReader(foam_path)
+        # Many OpenFOAM readers expose available times; use the last one when present
+        try:
+            reader.set_active_time_value(reader.time_values[-1])
+        except Exception:
+            pass
+        data = reader.read()
 
-# data can be a MultiBlock; merge to a single mesh for robust plotting
-mesh = data
-try:
-    if hasattr(data, 'combine'):
-        mesh = data.combine()
-except Exception:
-    # fallback: try first block
+    # data can be a MultiBlock; merge to a single mesh for robust plotting
+    mesh = data
     try:
-        mesh = data[0]
+        if hasattr(data, 'combine'):
+            mesh = data.combine()
     except Exception:
-        mesh = data
+        # fallback: try first block
+        try:
+            mesh = data[0]
+        except Exception:
+            mesh = data
 
 # Determine a scalar to plot
 scalar_name = None
@@ -255,6 +658,22 @@ if scalar_name is None:
     except Exception:
         scalar_name = None
 
+# Only the outer skin is visible, so render the extracted surface rather than the volume
+# grid; very large surfaces are additionally decimated when the scalar survives it.
+try:
+    if surface is None:
+        surface = mesh.extract_surface()
+    if surface.n_cells > {_DECIMATE_CELL_THRESHOLD}:
+        try:
+            decimated = surface.triangulate().decimate_pro(0.5, preserve_topology=True)
+            if scalar_name is None or scalar_name in decimated.point_data or scalar_name in decimated.cell_data:
+                surface = decimated
+        except Exception:
+            pass
+    mesh = surface
+except Exception:
+    pass
+
 plotter = pv.Plotter(off_screen=True)
 plotter.set_background('white')
 
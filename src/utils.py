@@ -1,9 +1,14 @@
 # utils.py
+import functools
+import hashlib
+import json
 import re
 import subprocess
 import os
 import signal
-from typing import Optional, Any, Type, TypedDict, List, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Type, TypedDict, List, Dict, Tuple
 from pydantic import BaseModel, Field
 from langchain.chat_models import init_chat_model
 from langchain_community.vectorstores import FAISS
@@ -24,11 +29,59 @@ try:
     from langchain_huggingface import HuggingFaceEmbeddings
 except ImportError:
     HuggingFaceEmbeddings = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # Global dictionary to store loaded FAISS databases
 FAISS_DB_CACHE = {}
 
+# Set by load_faiss_dbs: where retrieve_faiss persists results ("" disables it), and a
+# stamp of each loaded index's files so results from a rebuilt index are never served
+_FAISS_RESULT_CACHE_DIR = ""
+_FAISS_INDEX_STAMPS: Dict[str, str] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_hint(pydantic_obj: Type[BaseModel]) -> str:
+    """JSON-output instruction for a response model; the schema is generated once per class."""
+    return (
+        "Return ONLY valid JSON (no markdown) that matches this JSON Schema:\n"
+        + str(pydantic_obj.model_json_schema())
+    )
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """JSON-encode to UTF-8 bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+@functools.lru_cache(maxsize=256)
+def _read_llm_cache_entry(path: str) -> bytes:
+    """Read one cached LLM response; misses raise and are therefore never memoized."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_cache_entry(cache_path: str, payload: Any) -> None:
+    """Atomically write a JSON cache entry; the cache is best-effort, so errors are ignored."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_json_dumps(payload))
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError):
+        pass
+
 def get_embedding_model(config: Optional[Config] = None):
     """Return an embedding model based on the provided config.
 
@@ -55,6 +108,21 @@ def get_embedding_model(config: Optional[Config] = None):
     raise ValueError(f"Unsupported embedding provider: {provider}")
 
 
+def _faiss_index_stamp(index_path: Path) -> str:
+    """Identify the on-disk version of a saved index by its files, not its directory.
+
+    Rewriting index.faiss / index.pkl in place leaves the directory mtime unchanged.
+    """
+    parts = []
+    for name in ("index.faiss", "index.pkl"):
+        try:
+            st = (index_path / name).stat()
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
 def load_faiss_dbs(config: Optional[Config] = None):
     cfg = config or Config()
     embedding_model = get_embedding_model(cfg)
@@ -67,6 +135,10 @@ def load_faiss_dbs(config: Optional[Config] = None):
 
     print(f"Loading FAISS indices from: {db_path} with model: {cfg.embedding_model}")
 
+    global _FAISS_RESULT_CACHE_DIR
+    cache_dir = getattr(cfg, "llm_cache_dir", "") or ""
+    _FAISS_RESULT_CACHE_DIR = os.path.join(os.path.expanduser(cache_dir), "faiss", model_dir_name) if cache_dir else ""
+
     dbs = {}
     indices = [
         "openfoam_allrun_scripts",
@@ -82,6 +154,7 @@ def load_faiss_dbs(config: Optional[Config] = None):
                 dbs[index] = FAISS.load_local(
                     str(index_path), embedding_model, allow_dangerous_deserialization=True
                 )
+                _FAISS_INDEX_STAMPS[index] = _faiss_index_stamp(index_path)
             except Exception as e:
                 print(f"Failed to load index {index}: {e}")
         else:
@@ -143,6 +216,10 @@ class _CodexResponsesWrapper:
         self._account_id = account_id
         self._instructions = instructions
         self._stream = stream
+        # Reuse one keep-alive connection pool so repeated invokes (e.g. mesh correction
+        # retries) skip the TCP/TLS handshake after the first request.
+        self._session = requests.Session()
+        self._session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=16))
         # Token counting (best-effort). Exact tokenization may differ by model.
         # We default to a modern tokenizer; adjust if you need model-specific counting.
         try:
@@ -188,11 +265,7 @@ class _CodexResponsesWrapper:
                 return parent.get_num_tokens(text)
 
             def invoke(self, messages):
-                schema = pydantic_obj.model_json_schema()
-                schema_hint = (
-                    "Return ONLY valid JSON (no markdown) that matches this JSON Schema:\n"
-                    + str(schema)
-                )
+                schema_hint = _schema_hint(pydantic_obj)
 
                 patched = list(messages)
                 # Prepend a system constraint for JSON output.
@@ -284,7 +357,7 @@ class _CodexResponsesWrapper:
 
         payload = self._build_payload(messages)
 
-        r = requests.post(url, headers=headers, json=payload, timeout=60, stream=bool(self._stream))
+        r = self._session.post(url, headers=headers, json=payload, timeout=60, stream=bool(self._stream))
 
         # If we get an error, surface the response body to aid debugging.
         if not r.ok:
@@ -462,6 +535,10 @@ class LLMService:
         self.temperature = getattr(config, "temperature", 0)
         self.model_provider = getattr(config, "model_provider", "openai")
         self._config = config
+        # with_structured_output() rebuilds the tool/JSON schema on every call; keep one per model class
+        self._structured_llms: Dict[Type[BaseModel], Any] = {}
+        cache_dir = getattr(config, "llm_cache_dir", "") or ""
+        self._cache_dir = os.path.expanduser(cache_dir) if cache_dir else ""
         
         # Initialize statistics
         self.total_calls = 0
@@ -470,6 +547,10 @@ class LLMService:
         self.total_tokens = 0
         self.failed_calls = 0
         self.retry_count = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+        # One service is shared by every node and by the parallel file-generation workers
+        self._stats_lock = threading.Lock()
         
         # Initialize the LLM
         if self.model_provider.lower() == "bedrock":
@@ -577,7 +658,8 @@ class LLMService:
             The updated retry count if retry should continue, None if max retries exceeded
         """
         retry_count += 1
-        self.retry_count += 1
+        with self._stats_lock:
+            self.retry_count += 1
         
         if retry_count > max_retries:
 
@@ -600,7 +682,8 @@ class LLMService:
               user_prompt: str, 
               system_prompt: Optional[str] = None, 
               pydantic_obj: Optional[Type[BaseModel]] = None,
-              max_retries: int = 10) -> Any:
+              max_retries: int = 10,
+              cache_prefix: Optional[str] = None) -> Any:
         """
         Invoke the LLM with the given prompts and return the response.
         
@@ -609,11 +692,22 @@ class LLMService:
             system_prompt: Optional system prompt
             pydantic_obj: Optional Pydantic model for structured output
             max_retries: Maximum number of retries for throttling errors
+            cache_prefix: Optional leading part of user_prompt that repeats across calls;
+                marked as a cacheable prefix for providers that need explicit markers
             
         Returns:
             The LLM response with token usage statistics
         """
-        self.total_calls += 1
+        cache_path = self._cache_path(user_prompt, system_prompt, pydantic_obj)
+        if cache_path:
+            try:
+                cached = _json_loads(_read_llm_cache_entry(cache_path))
+                return pydantic_obj.model_validate(cached) if pydantic_obj else cached
+            except (OSError, ValueError):
+                pass
+
+        with self._stats_lock:
+            self.total_calls += 1
         
         messages = []
         if system_prompt:
@@ -624,22 +718,41 @@ class LLMService:
         prompt_tokens = 0
         for message in messages:
             prompt_tokens += self.llm.get_num_tokens(message["content"])
+
+        if system_prompt and self.model_provider.lower() == "anthropic":
+            # Mark the system prompt as a cacheable prefix so retries with the same
+            # instructions reuse it. OpenAI caches shared prefixes automatically.
+            messages[0] = {
+                "role": "system",
+                "content": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
+            }
+        if cache_prefix and self.model_provider.lower() == "anthropic" and user_prompt.startswith(cache_prefix):
+            # Second breakpoint after the shared part of the user prompt (references,
+            # requirement); only the per-call tail is then processed uncached
+            messages[-1] = {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+                    {"type": "text", "text": user_prompt[len(cache_prefix):] or " "},
+                ],
+            }
         
         retry_count = 0
         while True:
             try:
                 if pydantic_obj:
-                    structured_llm = self.llm.with_structured_output(pydantic_obj)
+                    structured_llm = self._structured_llm(pydantic_obj)
                     response = structured_llm.invoke(messages)
                 else:
                     if self.model_version.startswith("deepseek"):
-                        structured_llm = self.llm.with_structured_output(ResponseWithThinkPydantic)
+                        structured_llm = self._structured_llm(ResponseWithThinkPydantic)
                         response = structured_llm.invoke(messages)
 
                         # Extract the resposne without the think
                         response = response.response
                     else:
                         response = self.llm.invoke(messages)
+                        self._record_cache_usage(response)
                         response = response.content
 
                 # Calculate completion tokens
@@ -648,9 +761,13 @@ class LLMService:
                 total_tokens = prompt_tokens + completion_tokens
                 
                 # Update statistics
-                self.total_prompt_tokens += prompt_tokens
-                self.total_completion_tokens += completion_tokens
-                self.total_tokens += total_tokens
+                with self._stats_lock:
+                    self.total_prompt_tokens += prompt_tokens
+                    self.total_completion_tokens += completion_tokens
+                    self.total_tokens += total_tokens
+
+                if cache_path:
+                    self._store_cached_response(cache_path, response)
                 
                 return response
                 
@@ -661,7 +778,8 @@ class LLMService:
                     retry_count = self._handle_throttling_retry(e, retry_count, max_retries)
                     if retry_count is None:
                         # Max retries exceeded
-                        self.failed_calls += 1
+                        with self._stats_lock:
+                            self.failed_calls += 1
                         raise Exception(f"Maximum retries ({max_retries}) exceeded for throttling error: {str(e)}")
                     continue  # Retry the request
                 else:
@@ -671,9 +789,41 @@ class LLMService:
                     print(f"Error occurred in LLM service: {str(e)}")
                     if isinstance(e, ClientError):
                         print(e.response)
-                    self.failed_calls += 1
+                    with self._stats_lock:
+                        self.failed_calls += 1
                     raise e
     
+    def _record_cache_usage(self, message: Any) -> None:
+        """Accumulate provider-reported prompt-cache reads/writes from a chat message."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        details = usage.get("input_token_details") or {}
+        with self._stats_lock:
+            self.cache_read_tokens += details.get("cache_read") or 0
+            self.cache_creation_tokens += details.get("cache_creation") or 0
+
+    def _structured_llm(self, pydantic_obj: Type[BaseModel]) -> Any:
+        structured_llm = self._structured_llms.get(pydantic_obj)
+        if structured_llm is None:
+            structured_llm = self._structured_llms[pydantic_obj] = self.llm.with_structured_output(pydantic_obj)
+        return structured_llm
+
+    def _cache_path(self, user_prompt: str, system_prompt: Optional[str], pydantic_obj: Optional[Type[BaseModel]]) -> str:
+        """Content-addressed location of a response, or "" when caching is disabled."""
+        if not self._cache_dir:
+            return ""
+        key = hashlib.sha256()
+        for part in (self.model_provider, self.model_version, system_prompt or "", user_prompt,
+                     pydantic_obj.__name__ if pydantic_obj else ""):
+            key.update(part.encode("utf-8"))
+            key.update(b"\0")
+        return os.path.join(self._cache_dir, f"{key.hexdigest()}.json")
+
+    @staticmethod
+    def _store_cached_response(cache_path: str, response: Any) -> None:
+        payload = response.model_dump() if isinstance(response, BaseModel) else response
+        # The cache is best-effort; never fail the LLM call because of it
+        _write_cache_entry(cache_path, payload)
+
     def get_statistics(self) -> dict:
         """
         Get the current statistics of the LLM service.
@@ -688,6 +838,8 @@ class LLMService:
             "total_prompt_tokens": self.total_prompt_tokens,
             "total_completion_tokens": self.total_completion_tokens,
             "total_tokens": self.total_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
             "average_prompt_tokens": self.total_prompt_tokens / self.total_calls if self.total_calls > 0 else 0,
             "average_completion_tokens": self.total_completion_tokens / self.total_calls if self.total_calls > 0 else 0,
             "average_tokens": self.total_tokens / self.total_calls if self.total_calls > 0 else 0
@@ -705,6 +857,8 @@ class LLMService:
         print(f"Total prompt tokens: {stats['total_prompt_tokens']}")
         print(f"Total completion tokens: {stats['total_completion_tokens']}")
         print(f"Total tokens: {stats['total_tokens']}")
+        print(f"Prompt cache read tokens: {stats['cache_read_tokens']}")
+        print(f"Prompt cache creation tokens: {stats['cache_creation_tokens']}")
         print(f"Average prompt tokens per call: {stats['average_prompt_tokens']:.2f}")
         print(f"Average completion tokens per call: {stats['average_completion_tokens']:.2f}")
         print(f"Average tokens per call: {stats['average_tokens']:.2f}\n")
@@ -732,6 +886,7 @@ class GraphState(TypedDict):
     dir_structure: Optional[dict]
     commands: Optional[List[str]]
     foamfiles: Optional[dict]
+    foamfiles_hashes: Optional[dict]
     error_logs: Optional[List[str]]
     history_text: Optional[List[str]]
     case_domain: Optional[str]
@@ -764,8 +919,9 @@ def tokenize(text: str) -> str:
     text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
     return text.lower()
 
-def save_file(path: str, content: str) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+def save_file(path: str, content: str, make_dirs: bool = True) -> None:
+    if make_dirs:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, 'w') as f:
         f.write(content)
     print(f"Saved file at {path}")
@@ -1040,8 +1196,12 @@ def split_subtasks(text: str) -> list:
         print(f"Warning: Expected {num_subtasks} subtasks but found {len(subtasks)}.")
     return subtasks
 
+
+_FOAMFILE_BODY_RE = re.compile(r'FoamFile\s*\{.*?(?=```|$)', re.DOTALL | re.IGNORECASE)
+
+
 def parse_context(text: str) -> str:
-    match = re.search(r'FoamFile\s*\{.*?(?=```|$)', text, re.DOTALL | re.IGNORECASE)
+    match = _FOAMFILE_BODY_RE.search(text)
     if match:
         return match.group(0).strip()
     
@@ -1092,6 +1252,15 @@ def retrieve_faiss(database_name: str, query: str, topk: int = 1) -> dict:
     # Tokenize the query
     query = tokenize(query)
 
+    # With llm_cache_dir set, identical queries against an unchanged index skip the
+    # embedding + search entirely
+    cache_path = _faiss_cache_path(database_name, query, topk)
+    if cache_path:
+        try:
+            return _json_loads(_read_llm_cache_entry(cache_path))
+        except (OSError, ValueError):
+            pass
+
     vectordb = FAISS_DB_CACHE[database_name]
     try:
         docs_and_scores = vectordb.similarity_search_with_score(query, k=topk)
@@ -1104,9 +1273,73 @@ def retrieve_faiss(database_name: str, query: str, topk: int = 1) -> dict:
     if not docs:
         raise ValueError(f"No documents found for query: {query}")
 
+    formatted_results = _format_faiss_results(database_name, docs, scores)
+    if cache_path:
+        _write_cache_entry(cache_path, formatted_results)
+    return formatted_results
+
+
+def retrieve_faiss_batch(database_name: str, queries: List[str], topk: int = 1) -> List[list]:
+    """
+    Retrieve results for several queries from one FAISS database, in query order.
+
+    Equivalent to calling retrieve_faiss for each query, but all uncached queries are
+    embedded with a single embedding call instead of one round-trip each.
+    """
+
+    if database_name not in FAISS_DB_CACHE:
+        raise ValueError(f"Database '{database_name}' is not loaded.")
+
+    vectordb = FAISS_DB_CACHE[database_name]
+    embeddings = getattr(vectordb, "embeddings", None)
+    if embeddings is None:
+        # No batch embedding API behind this store: overlap the per-query round-trips instead
+        if len(queries) <= 1:
+            return [retrieve_faiss(database_name, query, topk=topk) for query in queries]
+        with ThreadPoolExecutor(max_workers=min(10, len(queries))) as pool:
+            return list(pool.map(lambda query: retrieve_faiss(database_name, query, topk=topk), queries))
+
+    tokenized = [tokenize(query) for query in queries]
+    results: List[Optional[list]] = [None] * len(queries)
+    cache_paths = [_faiss_cache_path(database_name, query, topk) for query in tokenized]
+    for i, cache_path in enumerate(cache_paths):
+        if cache_path:
+            try:
+                results[i] = _json_loads(_read_llm_cache_entry(cache_path))
+            except (OSError, ValueError):
+                pass
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        vectors = embeddings.embed_documents([tokenized[i] for i in missing])
+        for i, vector in zip(missing, vectors):
+            docs_and_scores = vectordb.similarity_search_with_score_by_vector(vector, k=topk)
+            if not docs_and_scores:
+                raise ValueError(f"No documents found for query: {tokenized[i]}")
+            results[i] = _format_faiss_results(
+                database_name, [d for d, _ in docs_and_scores], [s for _, s in docs_and_scores]
+            )
+            if cache_paths[i]:
+                _write_cache_entry(cache_paths[i], results[i])
+    return results
+
+
+def _faiss_cache_path(database_name: str, query: str, topk: int) -> str:
+    """On-disk location of a cached retrieval, or "" when result caching is disabled."""
+    if not _FAISS_RESULT_CACHE_DIR:
+        return ""
+    key = hashlib.sha1(
+        f"{database_name}|{_FAISS_INDEX_STAMPS.get(database_name, 0)}|{topk}|{query}".encode("utf-8")
+    ).hexdigest()
+    return os.path.join(_FAISS_RESULT_CACHE_DIR, f"{key}.json")
+
+
+def _format_faiss_results(database_name: str, docs: list, scores: list) -> list:
     formatted_results = []
     for doc, score in zip(docs, scores):
         metadata = doc.metadata or {}
+        # FAISS returns numpy scalars; plain floats keep results JSON-serializable
+        score = float(score) if score is not None else None
 
         if database_name == "openfoam_allrun_scripts":
             formatted_results.append({
@@ -1157,22 +1390,34 @@ def retrieve_faiss(database_name: str, query: str, topk: int = 1) -> dict:
     return formatted_results
         
 
+_DIR_BLOCK_RE = re.compile(r'<dir>(.*?)</dir>', re.DOTALL)
+_DIR_NAME_RE = re.compile(r'directory name:\s*(.*?)\.')
+_DIR_FILES_RE = re.compile(r'File names in this directory:\s*\[(.*?)\]')
+
+
 def parse_directory_structure(data: str) -> dict:
     """
     Parses the directory structure string and returns a dictionary where:
       - Keys: directory names
       - Values: count of files in that directory.
     """
+    # The same retrieved structure is parsed on every planning pass; the parse is
+    # memoized and each caller gets its own dict
+    return dict(_parse_directory_structure(data))
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_directory_structure(data: str) -> Tuple[Tuple[str, int], ...]:
     directory_file_counts = {}
 
     # Find all <dir>...</dir> blocks in the input string.
-    dir_blocks = re.findall(r'<dir>(.*?)</dir>', data, re.DOTALL)
+    dir_blocks = _DIR_BLOCK_RE.findall(data)
 
     for block in dir_blocks:
         # Extract the directory name (everything after "directory name:" until the first period)
-        dir_name_match = re.search(r'directory name:\s*(.*?)\.', block)
+        dir_name_match = _DIR_NAME_RE.search(block)
         # Extract the list of file names within square brackets
-        files_match = re.search(r'File names in this directory:\s*\[(.*?)\]', block)
+        files_match = _DIR_FILES_RE.search(block)
         
         if dir_name_match and files_match:
             dir_name = dir_name_match.group(1).strip()
@@ -1181,4 +1426,4 @@ def parse_directory_structure(data: str) -> dict:
             file_list = [filename.strip() for filename in files_str.split(',')]
             directory_file_counts[dir_name] = len(file_list)
 
-    return directory_file_counts
+    return tuple(directory_file_counts.items())
@@ -0,0 +1,16 @@
+"""Shared setup for the unit tests.
+
+The modules under ``src/`` use flat imports (``from utils import ...``) and build the
+LLM service and embedding model on import, so point them at the OpenAI providers with
+a placeholder key; no test here talks to a provider.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("FOAMAGENT_MODEL_PROVIDER", "openai")
+os.environ.setdefault("FOAMAGENT_EMBEDDING_PROVIDER", "openai")
+os.environ.setdefault("FOAMAGENT_EMBEDDING_MODEL", "text-embedding-3-small")
@@ -0,0 +1,88 @@
+"""Unit tests for the on-disk FAISS retrieval cache in utils."""
+import os
+
+import pytest
+
+import utils
+
+
+class _Doc:
+    def __init__(self, command):
+        self.page_content = command
+        self.metadata = {"full_content": f"help for {command}", "command": command}
+
+
+class _Embeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class _VectorStore:
+    """Minimal stand-in for a loaded LangChain FAISS store."""
+
+    def __init__(self):
+        self.embeddings = _Embeddings()
+        self.searches = 0
+
+    def similarity_search_with_score(self, query, k):
+        self.searches += 1
+        return [(_Doc(query), 0.25)]
+
+    def similarity_search_with_score_by_vector(self, vector, k):
+        self.searches += 1
+        return [(_Doc(str(int(vector[0]))), 0.25)]
+
+
+@pytest.fixture
+def command_db(monkeypatch, tmp_path):
+    store = _VectorStore()
+    monkeypatch.setitem(utils.FAISS_DB_CACHE, "openfoam_command_help", store)
+    monkeypatch.setitem(utils._FAISS_INDEX_STAMPS, "openfoam_command_help", "stamp-1")
+    monkeypatch.setattr(utils, "_FAISS_RESULT_CACHE_DIR", str(tmp_path / "faiss"))
+    return store
+
+
+def test_index_stamp_changes_when_files_are_rewritten_in_place(tmp_path):
+    index_dir = tmp_path / "openfoam_command_help"
+    index_dir.mkdir()
+    (index_dir / "index.faiss").write_bytes(b"a")
+    (index_dir / "index.pkl").write_bytes(b"b")
+    before = utils._faiss_index_stamp(index_dir)
+    dir_mtime = index_dir.stat().st_mtime_ns
+
+    (index_dir / "index.faiss").write_bytes(b"rebuilt")
+    os.utime(index_dir, ns=(dir_mtime, dir_mtime))
+
+    assert utils._faiss_index_stamp(index_dir) != before
+
+
+def test_repeated_query_is_served_from_disk(command_db):
+    first = utils.retrieve_faiss("openfoam_command_help", "blockMesh", topk=1)
+    second = utils.retrieve_faiss("openfoam_command_help", "blockMesh", topk=1)
+
+    assert second == first
+    assert command_db.searches == 1
+    assert isinstance(first[0]["score"], float)
+
+
+def test_rebuilt_index_is_not_served_stale_results(command_db, monkeypatch):
+    utils.retrieve_faiss("openfoam_command_help", "blockMesh", topk=1)
+    monkeypatch.setitem(utils._FAISS_INDEX_STAMPS, "openfoam_command_help", "stamp-2")
+
+    utils.retrieve_faiss("openfoam_command_help", "blockMesh", topk=1)
+
+    assert command_db.searches == 2
+
+
+def test_batch_matches_single_queries_with_one_embedding_call(command_db):
+    queries = ["blockMesh", "icoFoam", "checkMesh"]
+    batch = utils.retrieve_faiss_batch("openfoam_command_help", queries, topk=1)
+
+    assert len(command_db.embeddings.batches) == 1
+    assert batch == [utils.retrieve_faiss("openfoam_command_help", q, topk=1) for q in queries]
+    # Every batched result was cached, so the single queries above did not search again
+    assert command_db.searches == len(queries)
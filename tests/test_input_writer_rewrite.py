@@ -0,0 +1,76 @@
+"""Unit tests for rewrite_files, with the LLM replaced."""
+import pytest
+
+from services import input_writer
+from utils import FoamfilePydantic, FoamPydantic
+
+
+class _FakeLLM:
+    def __init__(self, files):
+        self.files = files
+
+    def invoke(self, user_prompt, system_prompt=None, pydantic_obj=None, **kwargs):
+        return FoamPydantic(list_foamfile=self.files)
+
+
+@pytest.fixture
+def case(tmp_path, monkeypatch):
+    case_dir = tmp_path / "case"
+    (case_dir / "system").mkdir(parents=True)
+    (case_dir / "system" / "controlDict").write_text("unchanged")
+    (case_dir / "system" / "fvSchemes").write_text("old schemes")
+
+    saved = []
+    real_save_file = input_writer.save_file
+    monkeypatch.setattr(input_writer, "save_file", lambda path, *a, **k: saved.append(path) or real_save_file(path, *a, **k))
+    return case_dir, saved
+
+
+def _rewrite(case_dir, dir_structure=None):
+    return input_writer.rewrite_files(
+        case_dir=str(case_dir),
+        error_logs=["error"],
+        review_analysis="fix the schemes",
+        rewrite_plan=None,
+        user_requirement="cavity",
+        foamfiles=FoamPydantic(list_foamfile=[]),
+        dir_structure=dir_structure if dir_structure is not None else {"system": ["controlDict", "fvSchemes"]},
+    )
+
+
+def test_unchanged_files_are_not_rewritten(case, monkeypatch):
+    case_dir, saved = case
+    monkeypatch.setattr(input_writer, "global_llm_service", _FakeLLM([
+        FoamfilePydantic(folder_name="system", file_name="controlDict", content="unchanged"),
+        FoamfilePydantic(folder_name="system", file_name="fvSchemes", content="new schemes"),
+    ]))
+
+    result = _rewrite(case_dir)
+
+    assert saved == [str(case_dir / "system" / "fvSchemes")]
+    assert (case_dir / "system" / "fvSchemes").read_text() == "new schemes"
+    # Skipped files are still part of the returned rewrite
+    assert [f.file_name for f in result["foamfiles"].list_foamfile] == ["controlDict", "fvSchemes"]
+
+
+def test_new_files_are_written_and_caller_structure_is_untouched(case, monkeypatch):
+    case_dir, saved = case
+    monkeypatch.setattr(input_writer, "global_llm_service", _FakeLLM([
+        FoamfilePydantic(folder_name="0", file_name="U", content="velocity"),
+    ]))
+    dir_structure = {"system": ["controlDict", "fvSchemes"]}
+
+    result = _rewrite(case_dir, dir_structure)
+
+    assert (case_dir / "0" / "U").read_text() == "velocity"
+    assert result["dir_structure"] == {"system": ["controlDict", "fvSchemes"], "0": ["U"]}
+    assert dir_structure == {"system": ["controlDict", "fvSchemes"]}
+
+
+def test_matches_on_disk_compares_exact_content(tmp_path):
+    path = tmp_path / "U"
+    path.write_text("héllo")
+
+    assert input_writer._matches_on_disk(str(path), "héllo")
+    assert not input_writer._matches_on_disk(str(path), "hello")
+    assert not input_writer._matches_on_disk(str(tmp_path / "missing"), "")
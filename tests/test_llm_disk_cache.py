@@ -0,0 +1,84 @@
+"""Unit tests for LLMService's opt-in on-disk response cache."""
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from config import Config
+from utils import LLMService
+
+
+class Answer(BaseModel):
+    value: int
+
+
+class _FakeChat:
+    """Chat model double that counts provider calls."""
+
+    def __init__(self, content="FoamFile { }"):
+        self.content = content
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=self.content, usage_metadata={})
+
+    def get_num_tokens(self, text):
+        return len(str(text).split())
+
+
+class _FakeStructured:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return Answer(value=42)
+
+
+def _service(cache_dir):
+    config = Config()
+    config.llm_cache_dir = str(cache_dir) if cache_dir else ""
+    service = LLMService(config)
+    service.llm = _FakeChat()
+    return service
+
+
+def test_identical_prompt_is_answered_from_disk(tmp_path):
+    first = _service(tmp_path)
+    assert first.invoke("write controlDict", "system") == "FoamFile { }"
+
+    # A new service (e.g. the next run) finds the response on disk
+    second = _service(tmp_path)
+    second.llm = _FakeChat(content="should not be used")
+    assert second.invoke("write controlDict", "system") == "FoamFile { }"
+    assert second.llm.calls == 0
+    assert second.get_statistics()["total_calls"] == 0
+
+
+def test_different_prompts_are_cached_separately(tmp_path):
+    service = _service(tmp_path)
+    service.invoke("write controlDict", "system")
+    service.invoke("write fvSchemes", "system")
+    service.invoke("write controlDict", "other system prompt")
+
+    assert service.llm.calls == 3
+
+
+def test_structured_responses_round_trip(tmp_path):
+    first = _service(tmp_path)
+    first._structured_llms[Answer] = _FakeStructured()
+    assert first.invoke("how many", "system", pydantic_obj=Answer) == Answer(value=42)
+
+    second = _service(tmp_path)
+    second._structured_llms[Answer] = structured = _FakeStructured()
+    assert second.invoke("how many", "system", pydantic_obj=Answer) == Answer(value=42)
+    assert structured.calls == 0
+
+
+def test_cache_is_off_by_default():
+    service = _service(None)
+    service.invoke("write controlDict", "system")
+    service.invoke("write controlDict", "system")
+
+    assert service.llm.calls == 2
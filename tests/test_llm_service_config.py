@@ -0,0 +1,37 @@
+"""Unit tests for the shared LLM service used by the service layer."""
+import services
+from config import Config
+
+
+def test_configured_service_uses_the_callers_config(tmp_path):
+    config = Config()
+    config.model_version = "gpt-4o-mini"
+    config.llm_cache_dir = str(tmp_path)
+
+    service = services.configure_llm_service(config)
+
+    assert services.get_llm_service() is service
+    assert service.model_version == "gpt-4o-mini"
+    assert service._cache_dir == str(tmp_path)
+
+
+def test_imported_global_follows_reconfiguration():
+    from services import global_llm_service
+
+    first = services.configure_llm_service(Config())
+    assert global_llm_service.model_version == first.model_version
+
+    config = Config()
+    config.model_version = "gpt-4.1"
+    services.configure_llm_service(config)
+    assert global_llm_service.model_version == "gpt-4.1"
+
+
+def test_each_run_starts_with_fresh_statistics():
+    first = services.configure_llm_service(Config())
+    first.total_calls = 7
+
+    second = services.configure_llm_service(Config())
+
+    assert second is not first
+    assert second.get_statistics()["total_calls"] == 0
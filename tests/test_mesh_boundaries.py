@@ -0,0 +1,61 @@
+"""Unit tests for the offline boundary-name extraction used by the gmsh mesh loop."""
+from pathlib import Path
+
+import pytest
+
+from services import mesh
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TANDEM_WING = (REPO_ROOT / "user_req_tandem_wing.txt").read_text()
+LID_DRIVEN_CAVITY = (REPO_ROOT / "user_requirement.txt").read_text()
+
+
+@pytest.fixture
+def llm_names(monkeypatch):
+    """Replace the LLM extraction and record the requirements it was asked about."""
+    calls = []
+
+    def fake_extract(user_requirement):
+        calls.append(user_requirement)
+        return ("fromLLM",)
+
+    monkeypatch.setattr(mesh, "_extract_boundary_names_cached", fake_extract)
+    return calls
+
+
+def test_tandem_wing_quoted_patches_skip_the_llm(llm_names):
+    names = mesh.extract_boundary_names_from_requirements(TANDEM_WING)
+
+    assert names == ["inlet", "outlet", "walls", "airfoil", "frontAndBack"]
+    assert llm_names == []
+
+
+def test_lid_driven_cavity_uses_the_llm(llm_names):
+    # "front and back faces" and "top wall" are mentioned without a patch name, and
+    # 'empty' is a patch type, so keywords alone cannot name the patches
+    assert mesh.extract_boundary_names_from_requirements(LID_DRIVEN_CAVITY) == ["fromLLM"]
+    assert llm_names == [LID_DRIVEN_CAVITY]
+
+
+def test_unquoted_keywords_use_the_llm(llm_names):
+    assert mesh.extract_boundary_names_from_requirements("Inlet on the left, outlet on the right") == ["fromLLM"]
+
+
+def test_patch_and_boundary_forms_are_explicit(llm_names):
+    requirement = (
+        "Flow around a cylinder with patch inlet, patch outlet, boundary cylinder and "
+        "boundary named walls; the walls use no-slip boundary conditions."
+    )
+
+    assert mesh.extract_boundary_names_from_requirements(requirement) == ["inlet", "outlet", "cylinder", "walls"]
+    assert llm_names == []
+
+
+def test_mentioned_but_unnamed_boundary_uses_the_llm(llm_names):
+    requirement = "The 'inlet' and 'outlet' are freestream; the top and bottom are slip walls."
+
+    assert mesh.extract_boundary_names_from_requirements(requirement) == ["fromLLM"]
+
+
+def test_quoted_names_keep_their_case_and_order():
+    assert mesh._explicit_boundary_names('Patches "Inlet", "farField" and "Inlet" again.') == ["Inlet", "farField"]
@@ -0,0 +1,78 @@
+"""Unit tests for the gmsh correction loop, with the LLM and external tools replaced."""
+import os
+
+import pytest
+
+from services import mesh
+
+BOUNDARY_FILE = """FoamFile
+{
+    version 2.0;
+}
+2
+(
+    inlet
+    {
+        type patch;
+    }
+    defaultFaces
+    {
+        type wall;
+    }
+)
+"""
+
+
+@pytest.fixture
+def gmsh_tools(monkeypatch):
+    """Fake gmsh/gmshToFoam runs that always produce the ``BOUNDARY_FILE`` patches."""
+
+    class FakeLLM:
+        def invoke(self, user_prompt, system_prompt=None, pydantic_obj=None, **kwargs):
+            return mesh.GMSHPythonCode(
+                python_code="import gmsh\n",
+                mesh_type="3D",
+                geometry_type="box",
+                boundary_names=["inlet", "outlet"],
+            )
+
+    def fake_run_and_tail(cmd, cwd, *args, **kwargs):
+        open(os.path.join(cwd, "geometry.msh"), "w").close()
+        return 0, "", "", 0
+
+    def fake_run_checked(cmd, cwd):
+        poly_mesh = os.path.join(cwd, "constant", "polyMesh")
+        os.makedirs(poly_mesh, exist_ok=True)
+        with open(os.path.join(poly_mesh, "boundary"), "w") as f:
+            f.write(BOUNDARY_FILE)
+        return ""
+
+    checkmesh_calls = []
+    monkeypatch.setattr(mesh, "global_llm_service", FakeLLM())
+    monkeypatch.setattr(mesh, "_run_and_tail", fake_run_and_tail)
+    monkeypatch.setattr(mesh, "_run_checked", fake_run_checked)
+    monkeypatch.setattr(mesh, "_write_llm_controldict", lambda prompt, path: "")
+    monkeypatch.setattr(mesh, "run_checkmesh_and_correct", lambda *a, **k: checkmesh_calls.append(a) or (True, False, None))
+    monkeypatch.setattr(mesh, "_rewrite_boundary_file", lambda *a, **k: "")
+    return checkmesh_calls
+
+
+def test_failed_correction_keeps_the_mesh_for_checkmesh(gmsh_tools, monkeypatch, tmp_path):
+    # The LLM call failed (or repeated an earlier script): there is nothing new to try
+    monkeypatch.setattr(mesh, "_correct_gmsh_python_code", lambda *a, **k: None)
+
+    result = mesh.handle_gmsh_mesh("box with inlet and outlet", str(tmp_path / "case"), max_loop=3)
+
+    assert len(gmsh_tools) == 1
+    assert result["mesh_info"] is not None
+
+
+def test_correction_with_the_same_mismatch_fails(gmsh_tools, monkeypatch, tmp_path):
+    corrections = iter(f"import gmsh\n# attempt {i}\n" for i in range(10))
+    monkeypatch.setattr(mesh, "_correct_gmsh_python_code", lambda *a, **k: next(corrections))
+
+    result = mesh.handle_gmsh_mesh("box with inlet and outlet", str(tmp_path / "case"), max_loop=3)
+
+    assert result["mesh_info"] is None
+    assert any("Boundary mismatch repeated" in log for log in result["error_logs"])
+    assert gmsh_tools == []  # never reached checkMesh with the wrong boundaries
@@ -0,0 +1,86 @@
+"""Unit tests for the offline physical-group fix applied to generated gmsh scripts."""
+import ast
+
+from services.mesh import _move_physical_groups_after_generate
+
+
+def _statements(code):
+    return [ast.unparse(stmt) for stmt in ast.parse(code).body]
+
+
+def test_physical_groups_move_after_generate():
+    code = (
+        "import gmsh\n"
+        "gmsh.initialize()\n"
+        "box = gmsh.model.occ.addBox(0, 0, 0, 1, 1, 1)\n"
+        "gmsh.model.occ.synchronize()\n"
+        "inlet = gmsh.model.addPhysicalGroup(2, [1])\n"
+        "gmsh.model.setPhysicalName(2, inlet, 'inlet')\n"
+        "gmsh.model.mesh.generate(3)\n"
+        "gmsh.write('geometry.msh')\n"
+    )
+
+    assert _statements(_move_physical_groups_after_generate(code)) == [
+        "import gmsh",
+        "gmsh.initialize()",
+        "box = gmsh.model.occ.addBox(0, 0, 0, 1, 1, 1)",
+        "gmsh.model.occ.synchronize()",
+        "gmsh.model.mesh.generate(3)",
+        "inlet = gmsh.model.addPhysicalGroup(2, [1])",
+        "gmsh.model.setPhysicalName(2, inlet, 'inlet')",
+        "gmsh.write('geometry.msh')",
+    ]
+
+
+def test_rewrite_applies_inside_functions():
+    code = (
+        "import gmsh\n"
+        "def build():\n"
+        "    gmsh.model.addPhysicalGroup(2, [1], name='wall')\n"
+        "    gmsh.model.mesh.generate(2)\n"
+        "build()\n"
+    )
+
+    rewritten = _move_physical_groups_after_generate(code)
+
+    body = _statements(rewritten)[1]
+    assert body.index("gmsh.model.mesh.generate(2)") < body.index("gmsh.model.addPhysicalGroup")
+
+
+def test_scripts_already_in_order_are_left_alone():
+    code = (
+        "import gmsh\n"
+        "gmsh.model.mesh.generate(3)\n"
+        "gmsh.model.addPhysicalGroup(2, [1], name='inlet')\n"
+    )
+
+    assert _move_physical_groups_after_generate(code) is None
+
+
+def test_rewrite_is_refused_when_a_kept_statement_reads_a_moved_name():
+    code = (
+        "import gmsh\n"
+        "tag = gmsh.model.addPhysicalGroup(2, [1])\n"
+        "print(tag)\n"
+        "gmsh.model.mesh.generate(3)\n"
+    )
+
+    assert _move_physical_groups_after_generate(code) is None
+
+
+def test_invalid_python_is_not_rewritten():
+    assert _move_physical_groups_after_generate("def broken(:\n") is None
+
+
+def test_geo_kernel_physical_groups_are_not_rewritten():
+    code = (
+        "import gmsh\n"
+        "gmsh.model.geo.addPoint(0, 0, 0)\n"
+        "gmsh.model.geo.addPhysicalGroup(2, [1], 5)\n"
+        "gmsh.model.geo.setPhysicalName(2, 5, 'inlet')\n"
+        "gmsh.model.addPhysicalGroup(2, [2], name='outlet')\n"
+        "gmsh.model.geo.synchronize()\n"
+        "gmsh.model.mesh.generate(3)\n"
+    )
+
+    assert _move_physical_groups_after_generate(code) is None
@@ -0,0 +1,35 @@
+"""Unit tests for running mesh tools with bounded output."""
+import re
+import sys
+import time
+
+from services.mesh import _run_and_tail
+
+
+def test_stop_pattern_kills_and_reaps_the_process(tmp_path):
+    script = (
+        "import sys, time\n"
+        "print('Checking geometry...', flush=True)\n"
+        "print('warning', file=sys.stderr, flush=True)\n"
+        "print('Mesh OK.', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    start = time.monotonic()
+
+    returncode, stdout, stderr, match = _run_and_tail(
+        [sys.executable, "-c", script], str(tmp_path), stop_pattern=re.compile(r"Mesh OK\.")
+    )
+
+    assert time.monotonic() - start < 30
+    assert match is not None
+    assert returncode < 0  # killed, and already reaped
+    assert stdout == "Checking geometry...\nMesh OK.\n"
+    assert stderr == "warning\n"
+
+
+def test_output_is_tailed(tmp_path):
+    script = "for i in range(100):\n    print(i)\n"
+
+    returncode, stdout, _, match = _run_and_tail([sys.executable, "-c", script], str(tmp_path), max_lines=3)
+
+    assert (returncode, stdout, match) == (0, "97\n98\n99\n", None)
@@ -0,0 +1,51 @@
+"""Unit tests for staging a custom mesh file into the case directory."""
+import os
+
+from services.mesh import _stage_mesh_file
+
+
+def test_stage_copies_mesh_into_case(tmp_path):
+    src = tmp_path / "geometry.msh"
+    src.write_text("mesh")
+    dst = tmp_path / "case" / "geometry.msh"
+    dst.parent.mkdir()
+
+    _stage_mesh_file(str(src), str(dst))
+
+    assert dst.read_text() == "mesh"
+    assert src.read_text() == "mesh"
+
+
+def test_stage_replaces_existing_destination(tmp_path):
+    src = tmp_path / "new.msh"
+    src.write_text("new")
+    dst = tmp_path / "geometry.msh"
+    dst.write_text("old")
+
+    _stage_mesh_file(str(src), str(dst))
+
+    assert dst.read_text() == "new"
+    assert sorted(os.listdir(tmp_path)) == ["geometry.msh", "new.msh"]
+
+
+def test_stage_onto_itself_keeps_the_only_copy(tmp_path):
+    # On a rerun custom_mesh_path can already be <case_dir>/geometry.msh
+    mesh = tmp_path / "geometry.msh"
+    mesh.write_text("mesh")
+
+    _stage_mesh_file(str(mesh), str(mesh))
+
+    assert mesh.read_text() == "mesh"
+    assert os.listdir(tmp_path) == ["geometry.msh"]
+
+
+def test_stage_onto_existing_hard_link_is_a_no_op(tmp_path):
+    src = tmp_path / "geometry.msh"
+    src.write_text("mesh")
+    dst = tmp_path / "linked.msh"
+    os.link(src, dst)
+
+    _stage_mesh_file(str(src), str(dst))
+
+    assert src.read_text() == "mesh"
+    assert dst.read_text() == "mesh"
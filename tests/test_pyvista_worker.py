@@ -0,0 +1,108 @@
+"""Unit tests for the long-lived PyVista worker's line protocol."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from services import visualization as viz
+
+WORKER = Path(__file__).resolve().parent.parent / "src" / "services" / "pyvista_worker.py"
+
+
+@pytest.fixture
+def worker():
+    proc = subprocess.Popen(
+        [sys.executable, str(WORKER)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+
+    def request(script_path, cwd, foam_file=None):
+        proc.stdin.write(json.dumps({"script_path": str(script_path), "cwd": str(cwd), "foam_file": foam_file}) + "\n")
+        proc.stdin.flush()
+        return json.loads(proc.stdout.readline())
+
+    yield request
+    proc.stdin.close()
+    proc.wait(timeout=30)
+
+
+def test_output_and_exit_codes_are_reported_per_script(worker, tmp_path):
+    ok = tmp_path / "ok.py"
+    ok.write_text(
+        "import os, sys\n"
+        "print('rendered')\n"
+        "print('warning', file=sys.stderr)\n"
+        "os.write(1, b'native vtk output\\n')\n"  # must not corrupt the protocol stream
+        "os.write(2, b'ERROR: vtkOpenFOAMReader\\n')\n"
+        "open('marker.txt', 'w').close()\n"
+    )
+    exits = tmp_path / "exits.py"
+    exits.write_text("import sys\nsys.exit(3)\n")
+    raises = tmp_path / "raises.py"
+    raises.write_text("raise RuntimeError('no field U')\n")
+
+    first = worker(ok, tmp_path)
+    assert first == {
+        "returncode": 0,
+        "stdout": "rendered\n",
+        "stderr": "warning\nnative vtk output\nERROR: vtkOpenFOAMReader\n",
+    }
+    assert (tmp_path / "marker.txt").exists()  # ran in the requested cwd
+
+    assert worker(exits, tmp_path)["returncode"] == 3
+
+    failed = worker(raises, tmp_path)
+    assert failed["returncode"] == 1
+    assert "RuntimeError: no field U" in failed["stderr"]
+
+    # The worker is still serving after a failing script, and native output is per request
+    assert worker(ok, tmp_path) == first
+
+
+def test_worker_crash_is_reported_without_rerunning_the_script(monkeypatch, tmp_path):
+    crash = tmp_path / "crash.py"
+    crash.write_text(
+        "import os, signal\n"
+        "with open('runs.txt', 'a') as f:\n"
+        "    f.write('run\\n')\n"
+        "os.write(2, b'vtkOpenGLRenderWindow: failed to create context\\n')\n"
+        "os.kill(os.getpid(), signal.SIGSEGV)\n"
+    )
+    monkeypatch.setattr(viz, "_run_streaming", lambda *a: pytest.fail("script re-run after a worker crash"))
+
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        viz._execute_script(str(crash), str(tmp_path), timeout_s=30)
+
+    assert excinfo.value.returncode == -11
+    assert "failed to create context" in excinfo.value.stderr
+    assert (tmp_path / "runs.txt").read_text() == "run\n"
+
+
+def test_results_stamp_follows_files_rewritten_in_place(tmp_path):
+    from services.pyvista_worker import _results_stamp
+
+    (tmp_path / "0").mkdir()
+    (tmp_path / "0.5").mkdir()
+    (tmp_path / "constant" / "polyMesh").mkdir(parents=True)
+    field = tmp_path / "0.5" / "U"
+    field.write_text("uniform (0 0 0)")
+    (tmp_path / "constant" / "polyMesh" / "points").write_text("()")
+    (tmp_path / "0" / "U").write_text("initial")
+    first = _results_stamp(str(tmp_path))
+    directory_mtime = (tmp_path / "0.5").stat().st_mtime_ns
+
+    field.write_text("uniform (1 0 0)")
+    os.utime(field, ns=(field.stat().st_atime_ns, field.stat().st_mtime_ns + 1_000_000))
+
+    assert (tmp_path / "0.5").stat().st_mtime_ns == directory_mtime
+    assert _results_stamp(str(tmp_path)) != first
+    # Only the latest time directory matters
+    before = _results_stamp(str(tmp_path))
+    (tmp_path / "0" / "U").write_text("initial, edited")
+    assert _results_stamp(str(tmp_path)) == before
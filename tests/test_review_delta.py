@@ -0,0 +1,39 @@
+"""Unit tests for the incremental foam-file serialization used in reviewer prompts."""
+from services.review import foamfile_hashes, serialize_foamfiles_delta
+from utils import FoamfilePydantic, FoamPydantic
+
+
+def _foamfiles(**contents):
+    return FoamPydantic(list_foamfile=[
+        FoamfilePydantic(folder_name=path.split("_")[0], file_name=path.split("_")[1], content=content)
+        for path, content in contents.items()
+    ])
+
+
+def test_first_review_serializes_everything():
+    foamfiles = _foamfiles(system_controlDict="a", **{"0_U": "b"})
+
+    assert serialize_foamfiles_delta(foamfiles, {}, []) == str(foamfiles)
+
+
+def test_unchanged_files_are_listed_by_path_only():
+    before = _foamfiles(system_controlDict="a", system_fvSchemes="b")
+    after = _foamfiles(system_controlDict="a", system_fvSchemes="changed")
+
+    text = serialize_foamfiles_delta(after, foamfile_hashes(before), [])
+
+    assert "changed" in text
+    assert "content='a'" not in text
+    assert text.endswith("<unchanged_since_last_review>system/controlDict</unchanged_since_last_review>")
+
+
+def test_files_named_in_the_errors_are_always_inlined():
+    foamfiles = _foamfiles(system_controlDict="a", system_fvSchemes="b")
+
+    text = serialize_foamfiles_delta(
+        foamfiles, foamfile_hashes(foamfiles), ["keyword div(phi,U) is undefined in system/fvSchemes"]
+    )
+
+    assert "content='b'" in text
+    assert "content='a'" not in text
+    assert "<unchanged_since_last_review>system/controlDict</unchanged_since_last_review>" in text
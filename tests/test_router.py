@@ -0,0 +1,69 @@
+"""Unit tests for workflow routing."""
+import pytest
+
+import router_func
+from router_func import RoutingDecision, _keyword_routing, classify_requirement
+
+
+@pytest.mark.parametrize(
+    "requirement, expected",
+    [
+        (
+            "Do an incompressible lid driven cavity flow with icoFoam.",
+            ("standard_mesh", "local", False),
+        ),
+        (
+            "Create the channel geometry with gmsh and run it on the slurm cluster.",
+            ("gmsh_mesh", "hpc", False),
+        ),
+        (
+            "The mesh is provided as a .msh file. Visualize the velocity magnitude.",
+            ("custom_mesh", "local", True),
+        ),
+        (
+            "Flow past a cylinder with no-slip walls; plot the pressure field.",
+            ("standard_mesh", "local", True),
+        ),
+    ],
+)
+def test_unambiguous_requirements_route_without_the_llm(requirement, expected):
+    decision = _keyword_routing(requirement)
+
+    assert (decision.mesh_type, decision.run_target, decision.needs_viz) == expected
+
+
+@pytest.mark.parametrize(
+    "requirement",
+    [
+        "Use gmsh to convert the provided .msh file.",  # gmsh and a mesh file
+        "Run the case in parallel on 4 cores.",  # parallel but no scheduler
+        "Do not produce any plots.",  # negated visualization
+        "Simulate flow through a cluster of cylinders.",  # cluster is not necessarily HPC
+        "Reproduce the setup shown in the reference figure.",  # figure may not mean output
+        "Compare the vorticity contours with the paper.",
+    ],
+)
+def test_ambiguous_requirements_defer_to_the_llm(requirement):
+    assert _keyword_routing(requirement) is None
+
+
+class _CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, user_prompt, system_prompt=None, pydantic_obj=None, **kwargs):
+        self.calls += 1
+        return RoutingDecision(mesh_type="custom_mesh", run_target="local", needs_viz=False)
+
+
+def test_llm_classification_is_made_once_per_requirement(monkeypatch):
+    monkeypatch.setattr(router_func, "_ROUTING_CACHE", {})
+    llm = _CountingLLM()
+    state = {"user_requirement": "Use gmsh to convert the provided .msh file.", "llm_service": llm}
+
+    first = classify_requirement(state)
+    second = classify_requirement(state)
+
+    assert first == second
+    assert first.mesh_type == "custom_mesh"
+    assert llm.calls == 1
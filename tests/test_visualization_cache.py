@@ -0,0 +1,35 @@
+"""Unit tests for reusing an up-to-date visualization.png."""
+import os
+
+from services.visualization import find_cached_visualization, scan_case
+
+SCRIPT = "reader = pv.OpenFOAMReader('case.foam')\nplotter.screenshot('visualization.png')\n"
+
+
+def _touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_png_is_stale_once_a_field_file_is_rewritten_in_place(tmp_path):
+    (tmp_path / "0.5").mkdir()
+    (tmp_path / "constant" / "polyMesh").mkdir(parents=True)
+    field = tmp_path / "0.5" / "U"
+    field.write_text("uniform (0 0 0)")
+    (tmp_path / "constant" / "polyMesh" / "points").write_text("()")
+    (tmp_path / "visualization.py").write_text(SCRIPT)
+    png = tmp_path / "visualization.png"
+    png.write_bytes(b"\x89PNG")
+    base = field.stat().st_mtime_ns
+    _touch(field, base)
+    _touch(tmp_path / "constant" / "polyMesh" / "points", base)
+    _touch(png, base + 1_000_000_000)
+
+    assert find_cached_visualization(str(tmp_path), SCRIPT) == str(png)
+
+    directory_mtime = (tmp_path / "0.5").stat().st_mtime_ns
+    field.write_text("uniform (1 0 0)")
+    _touch(field, base + 2_000_000_000)
+
+    assert (tmp_path / "0.5").stat().st_mtime_ns == directory_mtime
+    assert scan_case(str(tmp_path))["results_mtime_ns"] == base + 2_000_000_000
+    assert find_cached_visualization(str(tmp_path), SCRIPT) is None
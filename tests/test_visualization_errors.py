@@ -0,0 +1,59 @@
+"""Unit tests for error condensing and static checks of visualization scripts."""
+from services.visualization import normalize_errors, summarize_errors, validate_script
+
+TRACEBACK = """Traceback (most recent call last):
+  File "/tmp/tmpab12cd/visualization.py", line 3, in <module>
+    mesh = reader.read()
+ValueError: No arrays named 'U' at 0x7f3a9c2b1d40
+"""
+
+
+def test_normalize_errors_removes_run_specific_noise(tmp_path):
+    case_dir = str(tmp_path)
+    errors = [f"2024-05-01 12:00:00.123 failed in {case_dir}/system at 0xdeadbeef12 (/tmp/tmpab12cd)"]
+
+    assert normalize_errors(errors, case_dir) == ["<timestamp> failed in <case_dir>/system at <addr> (<tmp>)"]
+
+
+def test_summarize_keeps_the_exception_and_drops_repeats():
+    noisy = "\n".join(f"progress {i}" for i in range(50)) + "\n" + TRACEBACK
+
+    summary = summarize_errors([noisy, TRACEBACK], context_lines=3)
+
+    assert summary.splitlines()[-1] == "ValueError: No arrays named 'U' at <addr>"
+    assert "progress 0" not in summary
+    assert summary.count("ValueError") == 1
+
+
+def test_summarize_is_capped():
+    summary = summarize_errors(["x" * 10000], max_chars=100)
+
+    assert len(summary) == 100
+
+
+def test_valid_script_passes():
+    script = (
+        "import pyvista as pv\n"
+        "mesh = pv.OpenFOAMReader('case.foam').read()\n"
+        "mesh.plot(off_screen=True, screenshot='visualization.png')\n"
+    )
+
+    assert validate_script(script) == (True, "")
+
+
+def test_preloaded_data_counts_as_loading_the_case():
+    script = (
+        "import pyvista as pv\n"
+        "data = globals().get('preloaded_data')\n"
+        "plotter = pv.Plotter(off_screen=True)\n"
+        "plotter.add_mesh(data)\n"
+        "plotter.screenshot('visualization.png')\n"
+    )
+
+    assert validate_script(script)[0]
+
+
+def test_scripts_that_cannot_produce_an_image_are_rejected():
+    assert not validate_script("def broken(:\n")[0]
+    assert "never loads the case" in validate_script("plotter.screenshot('a.png')\n")[1]
+    assert "never saves an image" in validate_script("pv.OpenFOAMReader('case.foam').read()\n")[1]
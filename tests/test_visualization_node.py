@@ -0,0 +1,114 @@
+"""Unit tests for the visualization node's fallback order, with rendering and the LLM replaced."""
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import services.visualization as viz
+from nodes import visualization_node as node
+
+
+@pytest.fixture
+def renders(monkeypatch, tmp_path):
+    """Record every script run and LLM draft; ``outcomes`` decides which scripts render."""
+    calls = SimpleNamespace(runs=[], drafts=[], outcomes={})
+
+    def fake_run(case_dir, script, *, filename, expected_png, timeout_s, foam_file=None):
+        calls.runs.append(filename)
+        if calls.outcomes.get(filename, False):
+            return True, f"{case_dir}/{expected_png}", []
+        return False, "", [f"{filename} failed"]
+
+    def fake_generate(case_dir, foam_file, user_requirement, previous_errors):
+        calls.drafts.append(list(previous_errors))
+        return f"# draft {len(calls.drafts)}\n"
+
+    monkeypatch.setattr(viz, "run_pyvista_script", fake_run)
+    monkeypatch.setattr(viz, "generate_pyvista_script", fake_generate)
+    monkeypatch.setattr(viz, "fix_pyvista_script", lambda *a, **k: "# fixed\n")
+    monkeypatch.setattr(viz, "find_cached_visualization", lambda *a, **k: "")
+    node._DETERMINISTIC_FAILURES.clear()
+    return calls
+
+
+def _state(tmp_path, viz_parallelism):
+    case_dir = tmp_path / "case"
+    case_dir.mkdir(exist_ok=True)
+    config = SimpleNamespace(max_loop=1, viz_parallelism=viz_parallelism, viz_template_dir="")
+    return {"user_requirement": "plot velocity", "case_dir": str(case_dir), "config": config}
+
+
+def test_successful_template_makes_no_llm_calls(renders, tmp_path):
+    renders.outcomes["visualization.py"] = True
+
+    result = node.visualization_node(_state(tmp_path, viz_parallelism=3))
+
+    assert result["pyvista_visualization"]["used"] == "deterministic_template"
+    assert renders.drafts == []
+
+
+def test_parallel_drafts_see_the_template_errors(renders, tmp_path):
+    renders.outcomes["visualization_llm.py"] = True
+
+    result = node.visualization_node(_state(tmp_path, viz_parallelism=3))
+
+    assert result["pyvista_visualization"]["used"] == "llm_script"
+    assert len(renders.drafts) == 3
+    assert all(errors == ["visualization.py failed"] for errors in renders.drafts)
+    # The first draft that renders wins; the others are never run
+    assert renders.runs == ["visualization.py", "visualization_llm.py"]
+
+
+def test_first_draft_overlaps_the_stored_template_render(renders, monkeypatch, tmp_path):
+    drafted = threading.Event()
+    real_generate = viz.generate_pyvista_script
+
+    def generate_and_signal(*args):
+        script = real_generate(*args)
+        drafted.set()
+        return script
+
+    overlapped = []
+
+    def template_run(case_dir, script, *, filename, expected_png, timeout_s, foam_file=None):
+        if filename == "visualization_template.py":
+            # The LLM draft is requested while the stored template is still rendering
+            overlapped.append(drafted.wait(timeout=5))
+            renders.runs.append(filename)
+            return False, "", ["template failed"]
+        return real_run(case_dir, script, filename=filename, expected_png=expected_png, timeout_s=timeout_s)
+
+    real_run = viz.run_pyvista_script
+    monkeypatch.setattr(viz, "generate_pyvista_script", generate_and_signal)
+    monkeypatch.setattr(viz, "run_pyvista_script", template_run)
+    monkeypatch.setattr(viz, "load_script_template", lambda *a, **k: "# stored template\n")
+    renders.outcomes["visualization_llm.py"] = True
+    state = _state(tmp_path, viz_parallelism=1)
+    state["config"].viz_template_dir = str(tmp_path / "templates")
+
+    result = node.visualization_node(state)
+
+    assert overlapped == [True]
+    assert result["pyvista_visualization"]["used"] == "llm_script"
+    assert renders.drafts == [["visualization.py failed"]]
+    assert renders.runs == ["visualization.py", "visualization_template.py", "visualization_llm.py"]
+
+
+def test_known_template_failure_is_retried_after_results_are_rewritten(renders, tmp_path):
+    renders.outcomes["visualization_llm.py"] = True
+    state = _state(tmp_path, viz_parallelism=1)
+    (tmp_path / "case" / "1").mkdir()
+    field = tmp_path / "case" / "1" / "U"
+    field.write_text("uniform (0 0 0)")
+
+    node.visualization_node(state)
+    node.visualization_node(state)
+    assert renders.runs.count("visualization.py") == 1
+
+    # Rewritten in place: the time directory's own mtime does not change
+    field.write_text("uniform (1 0 0)")
+    mtime = field.stat().st_mtime_ns + 1_000_000_000
+    os.utime(field, ns=(mtime, mtime))
+    node.visualization_node(state)
+    assert renders.runs.count("visualization.py") == 2
@@ -0,0 +1,43 @@
+"""Unit tests for running a visualization script in its own interpreter."""
+import subprocess
+import sys
+
+import pytest
+
+from services.visualization import _run_streaming
+
+
+def _run(tmp_path, source):
+    script = tmp_path / "visualization.py"
+    script.write_text(source)
+    _run_streaming([sys.executable, str(script)], str(tmp_path), timeout_s=30)
+
+
+def test_vtk_reader_errors_do_not_kill_the_render(tmp_path):
+    _run(
+        tmp_path,
+        "import sys\n"
+        "print('ERROR: In vtkOpenFOAMReader.cxx, line 1: could not read U', file=sys.stderr, flush=True)\n"
+        "open('visualization.png', 'wb').write(b'png')\n",
+    )
+
+    assert (tmp_path / "visualization.png").exists()
+
+
+def test_memory_error_kills_the_render(tmp_path):
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        _run(
+            tmp_path,
+            "import sys, time\n"
+            "print('MemoryError', file=sys.stderr, flush=True)\n"
+            "time.sleep(30)\n",
+        )
+
+    assert "MemoryError" in excinfo.value.stderr
+
+
+def test_crash_is_reported_with_a_negative_return_code(tmp_path):
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        _run(tmp_path, "import os, signal\nos.kill(os.getpid(), signal.SIGSEGV)\n")
+
+    assert excinfo.value.returncode < 0